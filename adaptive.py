@@ -0,0 +1,135 @@
+import itertools
+import random
+from collections import deque
+
+from room.annealing import FurniturePlacementAnnealer
+from room.functions import (
+    Furniture,
+    furniture_penalty,
+    local_move_furniture,
+    move_furniture,
+    rotate_furniture,
+)
+
+# Move operators the scheduler chooses from
+OPERATORS = {
+    "move": move_furniture,
+    "rotate": rotate_furniture,
+    "nudge": local_move_furniture,
+}
+
+
+class AdaptiveMoveScheduler:
+    """
+    Multi-armed bandit choosing the move operator and the piece of
+    furniture of each annealing step.
+
+    For every operator the acceptance and improvement of its last `window`
+    moves are kept, with running counts of both so that drawing a move
+    does not depend on the window length, and operators are drawn with probability proportional
+    to their recent improvement rate plus a tenth of their acceptance
+    rate, never below `min_probability`. Pieces are drawn proportionally
+    to their share of the objective function (overlaps, wall, doors and
+    nearby preferences), refreshed every `refresh` moves, so the search
+    focuses on the pieces that carry the most penalty.
+    """
+
+    def __init__(self, furniture_dict, room_width, room_height, doors, window=200, min_probability=0.05, refresh=100):
+        self.furniture_dict = furniture_dict
+        self.furnitures = list(furniture_dict.values())
+        self.room_width = room_width
+        self.room_height = room_height
+        self.doors = doors
+        self.min_probability = min_probability
+        self.refresh = refresh
+        self.outcomes = {operator: deque(maxlen=window) for operator in OPERATORS}
+        self.accepted = dict.fromkeys(OPERATORS, 0)
+        self.improved = dict.fromkeys(OPERATORS, 0)
+        self.operators = list(OPERATORS)
+        self.probabilities = None
+        self.cum_probabilities = None
+        self.piece_weights = [1.0] * len(self.furnitures)
+        self.piece_cum_weights = list(itertools.accumulate(self.piece_weights))
+        self.pieces = range(len(self.furnitures))
+        self.proposals = 0
+        self.last_operator = None
+
+    def operator_probabilities(self):
+        """Current probability of each operator."""
+        scores = {}
+        for operator, outcomes in self.outcomes.items():
+            if outcomes:
+                improvement = self.improved[operator] / len(outcomes)
+                acceptance = self.accepted[operator] / len(outcomes)
+                scores[operator] = improvement + 0.1 * acceptance
+            else:
+                scores[operator] = 1.0
+        total = sum(scores.values())
+        free = 1.0 - self.min_probability * len(scores)
+        return {
+            operator: self.min_probability + free * (score / total if total > 0 else 1.0 / len(scores))
+            for operator, score in scores.items()
+        }
+
+    def update_piece_weights(self, state):
+        """Weigh every piece by its penalty, plus a floor so that no piece is starved."""
+        penalties = [
+            furniture_penalty(state, i, self.furniture_dict, self.room_width, self.room_height, self.doors)
+            for i in range(len(state))
+        ]
+        floor = max(sum(penalties) / len(penalties) * 0.1, 1.0)
+        self.piece_weights = [penalty + floor for penalty in penalties]
+        self.piece_cum_weights = list(itertools.accumulate(self.piece_weights))
+
+    def propose(self, state):
+        """Apply an operator chosen by the bandit to a piece chosen by penalty."""
+        if self.proposals % self.refresh == 0:
+            self.update_piece_weights(state)
+        self.proposals += 1
+        index = random.choices(self.pieces, cum_weights=self.piece_cum_weights)[0]
+        furniture: Furniture = self.furnitures[index]
+        if self.probabilities is None:
+            # Only recomputed after some feedback changed the counts
+            self.probabilities = self.operator_probabilities()
+            self.cum_probabilities = list(itertools.accumulate(self.probabilities.values()))
+        operator = random.choices(self.operators, cum_weights=self.cum_probabilities)[0]
+        if operator == "rotate" and furniture.front is None and furniture.width == furniture.height:
+            # Rotating a square without a front changes nothing
+            operator = "move"
+        self.last_operator = operator
+        return OPERATORS[operator](state, furniture, index, self.room_width, self.room_height)
+
+    def feedback(self, dE, accepted):
+        """Record the outcome of the last proposed move."""
+        operator = self.last_operator
+        if operator is None:
+            return
+        outcomes = self.outcomes[operator]
+        if len(outcomes) == outcomes.maxlen:
+            # The oldest outcome leaves the window
+            old_accepted, old_improved = outcomes[0]
+            self.accepted[operator] -= old_accepted
+            self.improved[operator] -= old_improved
+        improved = dE < 0
+        outcomes.append((accepted, improved))
+        self.accepted[operator] += accepted
+        self.improved[operator] += improved
+        self.probabilities = None
+
+
+class AdaptiveFurniturePlacementAnnealer(FurniturePlacementAnnealer):
+    """
+    Annealer whose moves are chosen by an `AdaptiveMoveScheduler`.
+    """
+
+    def __init__(self, room_width, room_height, doors, furniture_dict, **scheduler_options):
+        super().__init__(room_width, room_height, doors, furniture_dict)
+        self.scheduler = AdaptiveMoveScheduler(
+            furniture_dict, room_width, room_height, doors, **scheduler_options
+        )
+
+    def move(self):
+        self.state = self.scheduler.propose(self.state)
+
+    def move_feedback(self, dE, accepted):
+        self.scheduler.feedback(dE, accepted)
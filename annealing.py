@@ -32,11 +32,14 @@ class Annealer(object):
     copy_strategy = 'deepcopy'
     user_exit = False
     save_state_on_exit = False
+    # Stop as soon as the best energy reaches this value, if given
+    target_energy = None
 
     # placeholders
     best_state = None
     best_energy = None
     start = None
+    trajectory = None
 
     def __init__(self, initial_state=None, load_state=None):
         if initial_state is not None:
@@ -72,6 +75,12 @@ class Annealer(object):
         """Calculate state's energy"""
         pass
 
+    def move_feedback(self, dE, accepted):
+        """Called after every annealing step with the energy change of
+        the move and whether it was accepted. Does nothing by default.
+        """
+        pass
+
     def set_user_exit(self, signum, frame):
         """Raises the user_exit flag, further iterations are stopped
         """
@@ -185,6 +194,8 @@ class Annealer(object):
         if self.updates > 0:
             updateWavelength = self.steps / self.updates
             self.update(step, T, E, None, None)
+        if self.trajectory is not None:
+            self.trajectory.start(self.state, E)
 
         # Attempt moves to new states
         while step < self.steps and not self.user_exit:
@@ -201,11 +212,15 @@ class Annealer(object):
                 # Restore previous state
                 self.state = self.copy_state(prevState)
                 E = prevEnergy
+                self.move_feedback(dE, False)
             else:
                 # Accept new state and compare to best state
                 accepts += 1
                 if dE < 0.0:
                     improves += 1
+                self.move_feedback(dE, True)
+                if self.trajectory is not None:
+                    self.trajectory.record(step, prevState, self.state, dE)
                 prevState = self.copy_state(self.state)
                 prevEnergy = E
                 if E < self.best_energy:
@@ -216,6 +231,8 @@ class Annealer(object):
                     self.update(
                         step, T, E, accepts / trials, improves / trials)
                     trials = accepts = improves = 0
+            if self.target_energy is not None and self.best_energy <= self.target_energy:
+                break
 
         self.state = self.copy_state(self.best_state)
         if self.save_state_on_exit:
@@ -7,6 +7,8 @@ import pickle
 import sys
 import time
 
+import numpy as np
+
 from room.algos.utils import time_string
 
 class StochasticBeamSearch(ABC):
@@ -176,4 +178,144 @@ class StochasticBeamSearch(ABC):
         """
         Create a random assignment of values to variables.
         """
-        pass
\ No newline at end of file
+        pass
+
+class VectorizedBeamSearch(ABC):
+    """
+    Stochastic beam search over a population stored in NumPy arrays.
+
+    Every assignment is an array of shape (n, k), so the population is an
+    array of shape (P, n, k). Two population buffers are preallocated and
+    swapped between generations: selection, crossover and mutation write
+    the offspring into the spare buffer with whole-population array
+    operations instead of building a new list of states per generation.
+    The uniforms, weights and crossover masks are preallocated as well,
+    and random numbers are drawn into them with `out=`.
+
+    crossover_strategy is 'uniform' (each gene comes from either parent
+    with probability 1/2) or 'one_point' (genes before a random cut come
+    from the first parent).
+    """
+
+    crossover_strategy = 'uniform'
+
+    def __init__(self, population_size=100, temperature=100, max_generations=1000, acceptable_fitness=0, seed=None):
+        self.population_size = population_size
+        self.temperature = temperature
+        self.max_generations = max_generations
+        self.acceptable_fitness = acceptable_fitness
+        self.rng = np.random.default_rng(seed)
+        self.population = self.random_population(population_size)
+        self._offspring = np.empty_like(self.population)
+        self._parents = np.empty_like(self.population)
+        pairs = population_size // 2
+        self.fitnesses = np.empty(population_size)
+        self._weights = np.empty(population_size)
+        self._uniforms = np.empty(population_size)
+        self._gene_uniforms = np.empty((pairs, self.population.shape[1]))
+        self._mask = np.empty((pairs, self.population.shape[1], 1), dtype=bool)
+        self._genes = np.arange(self.population.shape[1])
+        self._cut_uniforms = np.empty((pairs, 1))
+        self._cuts = np.empty((pairs, 1), dtype=np.int64)
+
+    # The progress report and cooling schedule are the same as the list-based search
+    update = StochasticBeamSearch.update
+    default_update = StochasticBeamSearch.default_update
+    update_temperature = StochasticBeamSearch.update_temperature
+
+    def run(self):
+        """
+        Main method that runs the beam search algorithm.
+        Returns the best assignment as an array of shape (n, k).
+        """
+        self.start = time.time()
+        generation = 0
+        while True:
+            self.fitness_population(self.population, out=self.fitnesses)
+            best_fitness_idx = int(np.argmin(self.fitnesses))
+            best_fitness = self.fitnesses[best_fitness_idx]
+            self.update(generation, self.temperature, best_fitness)
+            if best_fitness <= self.acceptable_fitness or generation >= self.max_generations:
+                if generation >= self.max_generations:
+                    print("\nReached max generations")
+                else:
+                    print("\nFound solution in generation", generation)
+                return self.population[best_fitness_idx].copy()
+            self.step()
+            generation += 1
+
+    def step(self):
+        """
+        Produce the next generation from the current population and
+        fitnesses, then swap the population buffers.
+        """
+        parents = self.random_selection()
+        np.take(self.population, parents, axis=0, out=self._parents)
+        self.crossover_population(self._parents, self._offspring)
+        self.mutate_population(self._offspring)
+        self.population, self._offspring = self._offspring, self.population
+        self.update_temperature()
+
+    def random_selection(self):
+        """
+        Select population_size parent indices with probability proportional to e^(-h(A)/T).
+        """
+        temperature = max(self.temperature, 1e-10)
+        weights = self._weights
+        np.subtract(self.fitnesses.min(), self.fitnesses, out=weights)
+        weights /= temperature
+        np.exp(weights, out=weights)
+        np.cumsum(weights, out=weights)
+        self.rng.random(out=self._uniforms)
+        self._uniforms *= weights[-1]
+        # searchsorted has no output argument, its index array is the only allocation left
+        parents = np.searchsorted(weights, self._uniforms)
+        return np.minimum(parents, self.population_size - 1, out=parents)
+
+    def crossover_population(self, parents, offspring):
+        """
+        Cross consecutive pairs of parents into offspring.
+        The two children of a pair receive complementary genes.
+        """
+        np.copyto(offspring, parents)
+        pairs = len(self._mask)
+        mask = self._mask[:, :, 0]
+        if self.crossover_strategy == 'uniform':
+            self.rng.random(out=self._gene_uniforms)
+            np.less(self._gene_uniforms, 0.5, out=mask)
+        elif self.crossover_strategy == 'one_point':
+            # Cuts uniform in [1, n)
+            self.rng.random(out=self._cut_uniforms)
+            self._cut_uniforms *= max(len(self._genes), 2) - 1
+            np.copyto(self._cuts, self._cut_uniforms, casting='unsafe')
+            self._cuts += 1
+            np.greater_equal(self._genes, self._cuts, out=mask)
+        else:
+            raise RuntimeError('No implementation found for ' +
+                               'the crossover_strategy "%s"' %
+                               self.crossover_strategy)
+        first = slice(0, 2 * pairs, 2)
+        second = slice(1, 2 * pairs, 2)
+        np.copyto(offspring[first], parents[second], where=self._mask)
+        np.copyto(offspring[second], parents[first], where=self._mask)
+
+    @abstractmethod
+    def random_population(self, population_size):
+        """
+        Create an array of population_size random assignments.
+        """
+        pass
+
+    @abstractmethod
+    def fitness_population(self, population, out):
+        """
+        Calculate the fitness of every assignment of the population into out.
+        """
+        pass
+
+    @abstractmethod
+    def mutate_population(self, population):
+        """
+        Mutate every assignment of the population in place.
+        """
+        pass
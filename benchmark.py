@@ -0,0 +1,179 @@
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from room.annealing import FurniturePlacementAnnealer
+from room.config import load_room_config
+from room.functions import objective
+from room.kernel import FurniturePlacementKernelAnnealer
+from room.lahc import FurniturePlacementLAHC
+from room.tabu import FurniturePlacementTabuSearch
+from room.trajectory import TrajectoryRecorder
+from room.vectorized import FurniturePlacementVectorizedBeamSearch
+
+# Population size of the beam search in the algorithm comparison
+BEAM_POPULATION = 200
+
+
+def time_annealing(config_file, steps, seed, record=False):
+    """
+    Run a silent annealing on a room configuration.
+    Returns the elapsed time in seconds and the best energy.
+    """
+    room_width, room_height, doors, furniture_dict = load_room_config(config_file)
+    random.seed(seed)
+    annealer = FurniturePlacementAnnealer(room_width, room_height, doors, furniture_dict)
+    annealer.set_schedule({'tmax': 5000, 'tmin': 0.001, 'steps': steps, 'updates': 0})
+    if record:
+        annealer.trajectory = TrajectoryRecorder(steps, len(furniture_dict))
+    start = time.perf_counter()
+    _, best_energy = annealer.anneal()
+    return time.perf_counter() - start, best_energy
+
+
+def benchmark_trajectory(config_files, steps, seeds):
+    """
+    Measure the overhead of recording the annealing trajectory.
+    Both runs of a seed explore exactly the same states.
+    """
+    print("\nTrajectory recording overhead")
+    print("%-30s %12s %12s %10s" % ("Config", "Plain (s)", "Recorded (s)", "Overhead"))
+    for config_file in config_files:
+        plain = recorded = 0.0
+        for seed in range(seeds):
+            plain += time_annealing(config_file, steps, seed)[0]
+            recorded += time_annealing(config_file, steps, seed, record=True)[0]
+        print("%-30s %12.3f %12.3f %9.1f%%" % (config_file, plain, recorded, 100 * (recorded / plain - 1)))
+
+
+def run_annealing(room, evaluations):
+    annealer = FurniturePlacementAnnealer(*room)
+    annealer.set_schedule({'tmax': 5000, 'tmin': 0.001, 'steps': evaluations, 'updates': 0})
+    annealer.target_energy = 0
+    return annealer.anneal()[1]
+
+
+def run_blocks(room, evaluations):
+    annealer = FurniturePlacementKernelAnnealer(*room)
+    annealer.set_schedule({'tmax': 5000, 'tmin': 0.001, 'steps': evaluations, 'updates': 0})
+    annealer.target_energy = 0
+    return annealer.anneal_blocks()[1]
+
+
+def run_beam_search(room, evaluations):
+    room_width, room_height, doors, furniture_dict = room
+    beam_search = FurniturePlacementVectorizedBeamSearch(
+        *room,
+        population_size=BEAM_POPULATION,
+        temperature=5000,
+        max_generations=max(evaluations // BEAM_POPULATION, 1),
+        seed=random.getrandbits(32),
+    )
+    beam_search.update = lambda *args: None
+    with contextlib.redirect_stdout(io.StringIO()):
+        best_state = beam_search.run()
+    return objective(best_state, furniture_dict, room_width, room_height, doors)
+
+
+def run_tabu(room, evaluations):
+    tabu = FurniturePlacementTabuSearch(*room)
+    tabu.steps = max(evaluations // tabu.neighbourhood, 1)
+    tabu.updates = 0
+    return tabu.run()[1]
+
+
+def run_lahc(room, evaluations):
+    lahc = FurniturePlacementLAHC(*room)
+    lahc.steps = evaluations
+    lahc.updates = 0
+    return lahc.run()[1]
+
+
+# Engines compared by the benchmark, each runs with a budget of objective evaluations
+ENGINES = {
+    "annealing": run_annealing,
+    "blocks": run_blocks,
+    "beamsearch": run_beam_search,
+    "tabu": run_tabu,
+    "lahc": run_lahc,
+}
+
+
+def benchmark_algorithms(config_files, evaluations, seeds, engines=tuple(ENGINES)):
+    """
+    Compare the time each engine needs to reach energy 0 with the same
+    budget of objective evaluations. Runs that do not reach 0 count as
+    failures and are excluded from the mean time.
+    """
+    print("\nTime to zero energy (%d objective evaluations per run)" % evaluations)
+    print("%-30s %-12s %8s %14s %12s" % ("Config", "Engine", "Solved", "Mean time (s)", "Mean energy"))
+    for config_file in config_files:
+        room = load_room_config(config_file)
+        for engine in engines:
+            times, energies = [], []
+            for seed in range(seeds):
+                random.seed(seed)
+                start = time.perf_counter()
+                energy = ENGINES[engine](room, evaluations)
+                elapsed = time.perf_counter() - start
+                energies.append(energy)
+                if energy <= 1e-9:
+                    times.append(elapsed)
+            mean_time = "%14.3f" % (sum(times) / len(times)) if times else "%14s" % "-"
+            print("%-30s %-12s %4d/%-3d %s %12.2f" % (
+                config_file, engine, len(times), seeds, mean_time, sum(energies) / len(energies)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the furniture placement solvers")
+    parser.add_argument(
+        "-c",
+        "--configs",
+        nargs="+",
+        required=True,
+        help="Paths to the room configuration YAML files",
+    )
+    parser.add_argument(
+        "-b",
+        "--benchmarks",
+        nargs="+",
+        choices=["trajectory", "algorithms"],
+        default=["trajectory", "algorithms"],
+        help="Benchmarks to run (default: all)",
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        default=10000,
+        help="Number of steps for annealing (default: 10000)",
+    )
+    parser.add_argument(
+        "--evaluations",
+        type=int,
+        default=50000,
+        help="Objective evaluations per run in the algorithm comparison (default: 50000)",
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(ENGINES),
+        default=list(ENGINES),
+        help="Engines of the algorithm comparison (default: all)",
+    )
+    parser.add_argument(
+        "--seeds",
+        type=int,
+        default=3,
+        help="Number of seeds per configuration (default: 3)",
+    )
+    args = parser.parse_args()
+    if "trajectory" in args.benchmarks:
+        benchmark_trajectory(args.configs, args.steps, args.seeds)
+    if "algorithms" in args.benchmarks:
+        benchmark_algorithms(args.configs, args.evaluations, args.seeds, args.engines)
+
+
+if __name__ == "__main__":
+    main()
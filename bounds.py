@@ -0,0 +1,109 @@
+import numpy as np
+
+from room.functions import (
+    DOOR_PENALTY,
+    OVERLAP_PENALTY,
+    WALL_PENALTY,
+    FurnitureFront,
+)
+from room.vectorized import door_bbox, door_overlap_counts
+
+# Smallest penalty of a pair of overlapping pieces, counted once per piece
+PAIR_OVERLAP_PENALTY = 2 * OVERLAP_PENALTY
+
+
+def door_zone_area(room_width, room_height, doors):
+    """Floor area covered by the opening areas of the doors."""
+    covered = np.zeros((room_width, room_height), dtype=bool)
+    for door in doors:
+        x1, y1, x2, y2 = door_bbox(door)
+        covered[max(x1, 0) : min(x2, room_width), max(y1, 0) : min(y2, room_height)] = True
+    return int(covered.sum())
+
+
+def forced_door_overlaps(furniture, room_width, room_height, doors):
+    """
+    Smallest number of door opening areas the piece overlaps over all its
+    positions. Doors are checked against the unrotated piece, whatever
+    its orientation.
+    """
+    if not doors:
+        return 0
+    door_boxes = [door_bbox(door) for door in doors]
+    return int(door_overlap_counts(furniture.width, furniture.height, room_width, room_height, door_boxes).min())
+
+
+def wall_contact(furniture):
+    """Shortest length of wall the back of the piece can touch."""
+    if furniture.front == FurnitureFront.LONG_SIDE:
+        return max(furniture.width, furniture.height)
+    return min(furniture.width, furniture.height)
+
+
+def lower_bound(room_width, room_height, doors, furniture_dict):
+    """
+    Provable lower bound of `objective` over the placements the solvers
+    can reach, and the list of constraints that cannot all be satisfied.
+
+    Square pieces without a front are never rotated, so if they prefer a
+    wall they are never on it. A piece that overlaps a door opening
+    wherever it goes pays the door penalty. Other conflicts only prove
+    that at least one penalty is paid: pieces whose total area exceeds the
+    floor they can use must overlap each other or a door, and pieces whose
+    total wall contact exceeds the room perimeter must overlap or leave
+    the wall.
+    """
+    n = len(furniture_dict)
+    issues = []
+    bound = 0
+
+    wall_pieces = []
+    for furniture in furniture_dict.values():
+        if not furniture.preferred_on_wall:
+            continue
+        if furniture.front is None and furniture.width == furniture.height:
+            bound += WALL_PENALTY * n
+            issues.append("%s prefers a wall but cannot be oriented towards one" % furniture.name)
+        else:
+            wall_pieces.append(furniture)
+
+    door_penalty = 0
+    for furniture in furniture_dict.values():
+        overlaps = forced_door_overlaps(furniture, room_width, room_height, doors)
+        if overlaps:
+            door_penalty += DOOR_PENALTY * overlaps
+            issues.append("%s overlaps a door opening wherever it is placed" % furniture.name)
+
+    # Pieces with a front swap their sides when rotated but are placed by
+    # their unrotated dimensions, so they can stick out of the room
+    extra_width = extra_height = 0
+    for furniture in furniture_dict.values():
+        if furniture.front is not None:
+            longest = max(furniture.width, furniture.height)
+            extra_width = max(extra_width, longest - furniture.width)
+            extra_height = max(extra_height, longest - furniture.height)
+
+    # Pieces that are never reshaped stay in the room and out of the doors
+    area_penalty = 0
+    total_area = sum(f.width * f.height for f in furniture_dict.values())
+    fixed_area = sum(
+        f.width * f.height for f in furniture_dict.values() if f.front is None or f.width == f.height
+    )
+    free_area = room_width * room_height - door_zone_area(room_width, room_height, doors)
+    if total_area > (room_width + extra_width) * (room_height + extra_height) or fixed_area > free_area:
+        area_penalty = min(PAIR_OVERLAP_PENALTY, DOOR_PENALTY)
+        issues.append("the furniture (%d) does not fit in the free floor area (%d)" % (total_area, free_area))
+
+    # Pieces on the same wall cannot share any length of it
+    wall_penalty = 0
+    perimeter = 2 * (room_width + extra_width) + 2 * (room_height + extra_height)
+    contacts = sorted(wall_contact(f) for f in wall_pieces)
+    if sum(contacts) > perimeter:
+        wall_penalty = min(PAIR_OVERLAP_PENALTY, WALL_PENALTY * n)
+        issues.append(
+            "the furniture preferring a wall needs %d of wall, the room has %d" % (sum(contacts), perimeter)
+        )
+
+    # A door penalty and a wall or overlap penalty are different penalties,
+    # the area conflict may be paid by either
+    return bound + max(door_penalty + wall_penalty, area_penalty), issues
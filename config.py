@@ -0,0 +1,266 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+import yaml
+
+from room.functions import Door, Furniture, FurnitureFront
+from room.symmetry import group_ids, interchangeable_groups
+from room.vectorized import RoomTables
+
+# Use the libyaml bindings when PyYAML was built with them
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Compiled rooms: header, arrays aligned on ALIGNMENT bytes, JSON metadata
+COMPILED_SUFFIX = ".roomc"
+MAGIC = b"ROOM"
+VERSION = 2
+HEADER = struct.Struct("<4sHHQQ")
+ALIGNMENT = 64
+
+
+class RoomConfigError(ValueError):
+    """Raised when a room configuration is malformed or geometrically impossible"""
+
+    def __init__(self, source, errors):
+        self.source = source
+        self.errors = errors
+        super().__init__("Invalid room configuration %s:\n  %s" % (source, "\n  ".join(errors)))
+
+
+def is_size(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def validate_room_config(config):
+    """
+    Check the schema and the geometry of a parsed room configuration.
+    Returns the list of problems found, empty if the configuration is valid.
+    """
+    if not isinstance(config, dict):
+        return ["the configuration must be a mapping"]
+    errors = []
+    room_width, room_height = config.get("room_width"), config.get("room_height")
+    for key, value in (("room_width", room_width), ("room_height", room_height)):
+        if not is_size(value):
+            errors.append("%s must be a positive integer, got %r" % (key, value))
+    if errors:
+        return errors
+
+    doors = config.get("doors", [])
+    if not isinstance(doors, list):
+        errors.append("doors must be a list")
+        doors = []
+    for k, door in enumerate(doors):
+        name = door.get("name", k) if isinstance(door, dict) else k
+        if not isinstance(door, dict) or not {"name", "position", "length", "is_horizontal"} <= door.keys():
+            errors.append("door %s needs name, position, length and is_horizontal" % name)
+            continue
+        position, length = door["position"], door["length"]
+        if not (isinstance(position, list) and len(position) == 2 and all(isinstance(v, int) for v in position)):
+            errors.append("door %s: position must be [x, y] integers" % name)
+            continue
+        if not is_size(length):
+            errors.append("door %s: length must be a positive integer" % name)
+            continue
+        x, y = position
+        if door["is_horizontal"]:
+            if y not in (0, room_height) or x < 0 or x + length > room_width:
+                errors.append("door %s is not on the bottom or top wall" % name)
+        elif x not in (0, room_width) or y < 0 or y + length > room_height:
+            errors.append("door %s is not on the left or right wall" % name)
+
+    furnitures = config.get("furnitures")
+    if not isinstance(furnitures, list) or not furnitures:
+        errors.append("furnitures must be a non-empty list")
+        return errors
+    names = [furniture.get("name") for furniture in furnitures if isinstance(furniture, dict)]
+    seen = set()
+    for k, furniture in enumerate(furnitures):
+        if not isinstance(furniture, dict) or not {"name", "width", "height", "color"} <= furniture.keys():
+            errors.append("furniture %d needs name, width, height and color" % k)
+            continue
+        name = furniture["name"]
+        if name in seen:
+            errors.append("furniture %s is defined twice" % name)
+        seen.add(name)
+        width, height = furniture["width"], furniture["height"]
+        if not (is_size(width) and is_size(height)):
+            errors.append("furniture %s: width and height must be positive integers" % name)
+        elif width > room_width or height > room_height:
+            errors.append("furniture %s (%dx%d) does not fit in the room" % (name, width, height))
+        front = furniture.get("front")
+        if front is not None and front not in list(FurnitureFront):
+            errors.append("furniture %s: front must be one of %s" % (name, ", ".join(FurnitureFront)))
+        nearby = furniture.get("nearby_furniture", [])
+        if not isinstance(nearby, list):
+            errors.append("furniture %s: nearby_furniture must be a list" % name)
+            continue
+        for other in nearby:
+            if other not in names:
+                errors.append("furniture %s: nearby furniture %s is not defined" % (name, other))
+    return errors
+
+
+def parse_room_config(config, source="<config>"):
+    """Validate a parsed room configuration and build the room objects."""
+    errors = validate_room_config(config)
+    if errors:
+        raise RoomConfigError(source, errors)
+    room_width = config["room_width"]
+    room_height = config["room_height"]
+    doors = [
+        Door(door["name"], door["position"], door["length"], door["is_horizontal"])
+        for door in config.get("doors", [])
+    ]
+    furniture_dict = {
+        furniture["name"]: Furniture(
+            furniture["name"],
+            furniture["width"],
+            furniture["height"],
+            furniture["color"],
+            furniture.get("preferred_on_wall"),
+            furniture.get("nearby_furniture", []),
+            furniture.get("front", None),
+        )
+        for furniture in config["furnitures"]
+    }
+    return room_width, room_height, doors, furniture_dict
+
+
+def load_room_config(config_file):
+    """Load room configuration from a YAML file or a compiled room file."""
+    if config_file.endswith(COMPILED_SUFFIX):
+        return load_compiled_room(config_file)
+    with open(config_file) as file:
+        config = yaml.load(file, Loader=YamlLoader)
+    return parse_room_config(config, config_file)
+
+
+def compile_room(room_width, room_height, doors, furniture_dict):
+    """
+    Serialize a room into the compiled format: the arrays of its
+    `RoomTables`, ready to be mapped without copies, followed by the JSON
+    description of the doors and furniture.
+    """
+    tables = RoomTables(room_width, room_height, doors, furniture_dict)
+    chunks = [b"\0" * HEADER.size]
+    offset = HEADER.size
+    arrays = {}
+    for name in RoomTables.ARRAYS:
+        array = np.ascontiguousarray(getattr(tables, name))
+        padding = -offset % ALIGNMENT
+        chunks.append(b"\0" * padding)
+        offset += padding
+        arrays[name] = [offset, array.dtype.str, list(array.shape)]
+        chunks.append(array.tobytes())
+        offset += array.nbytes
+    metadata = json.dumps(
+        {
+            "room_width": room_width,
+            "room_height": room_height,
+            "arrays": arrays,
+            "doors": [[d.name, list(d.pos), d.length, d.is_horizontal] for d in doors],
+            "furnitures": [
+                [f.name, f.width, f.height, f.color, f.preferred_on_wall, list(f.nearby_furniture), f.front]
+                for f in furniture_dict.values()
+            ],
+        }
+    ).encode()
+    chunks.append(metadata)
+    chunks[0] = HEADER.pack(MAGIC, VERSION, 0, offset, len(metadata))
+    return b"".join(chunks)
+
+
+def read_metadata(buffer):
+    magic, version, _, offset, length = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        raise RoomConfigError("<compiled>", ["not a compiled room file of version %d" % VERSION])
+    return json.loads(bytes(buffer[offset : offset + length]))
+
+
+def read_room(buffer):
+    """Room objects of a compiled room held in any buffer."""
+    metadata = read_metadata(buffer)
+    doors = [Door(name, pos, length, is_horizontal) for name, pos, length, is_horizontal in metadata["doors"]]
+    furniture_dict = {item[0]: Furniture(*item) for item in metadata["furnitures"]}
+    return metadata["room_width"], metadata["room_height"], doors, furniture_dict
+
+
+def read_tables(buffer):
+    """
+    `RoomTables` of a compiled room held in any buffer (bytes, mmap,
+    shared memory). The arrays are views on the buffer, nothing is copied.
+    """
+    metadata = read_metadata(buffer)
+    arrays = {
+        name: np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        for name, (offset, dtype, shape) in metadata["arrays"].items()
+    }
+    return RoomTables.from_arrays(metadata["room_width"], metadata["room_height"], **arrays)
+
+
+def map_compiled_room(path):
+    """Memory-map a compiled room file read-only."""
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def load_compiled_room(path):
+    """Load the room objects of a compiled room file."""
+    with open(path, "rb") as file:
+        return read_room(file.read())
+
+
+def load_compiled_tables(path):
+    """Memory-map the `RoomTables` of a compiled room file."""
+    return read_tables(map_compiled_room(path))
+
+
+def compile_room_config(config_file, output=None):
+    """Validate a YAML room configuration and write its compiled version."""
+    output = output or os.path.splitext(config_file)[0] + COMPILED_SUFFIX
+    with open(output, "wb") as file:
+        file.write(compile_room(*load_room_config(config_file)))
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and compile room configurations")
+    parser.add_argument("configs", nargs="+", help="Room configuration YAML files")
+    parser.add_argument(
+        "-o",
+        "--output_dir",
+        type=str,
+        default=None,
+        help="Directory of the compiled rooms (default: next to each configuration)",
+    )
+    args = parser.parse_args()
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    failed = 0
+    for config_file in args.configs:
+        output = None
+        if args.output_dir:
+            name = os.path.splitext(os.path.basename(config_file))[0] + COMPILED_SUFFIX
+            output = os.path.join(args.output_dir, name)
+        try:
+            output = compile_room_config(config_file, output)
+        except RoomConfigError as error:
+            print(error)
+            failed += 1
+            continue
+        print("Compiled", output)
+        room_width, room_height, doors, furniture_dict = load_compiled_room(output)
+        names = list(furniture_dict)
+        for indices in interchangeable_groups(group_ids(furniture_dict)):
+            print("  interchangeable:", ", ".join(names[i] for i in indices))
+    if failed:
+        raise SystemExit("%d invalid configurations" % failed)
+
+
+if __name__ == "__main__":
+    main()
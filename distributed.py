@@ -0,0 +1,511 @@
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from room.config import compile_room, load_room_config, read_room, read_tables
+from room.portfolio import ENGINES
+from room.vectorized import decode_state, door_penalty_maps
+
+# Settings of the engines, as in `room.portfolio.PortfolioSolver`, plus the time limit of a task
+DEFAULT_OPTIONS = {
+    "tmax": 5000,
+    "tmin": 0.001,
+    "steps": 10000,
+    "population_size": 100,
+    "max_generations": 1000,
+    "migration_interval": 10,
+    "time_limit": 10,
+}
+
+# Task states
+PENDING, RUNNING, DONE, CANCELLED, FAILED = "pending", "running", "done", "cancelled", "failed"
+
+
+def parse_address(address):
+    """(host, port) of a "host:port" string."""
+    host, _, port = address.rpartition(":")
+    return host or "localhost", int(port)
+
+
+class Task:
+    """One run of an engine of `room.portfolio.ENGINES` on a room with a seed."""
+
+    def __init__(self, task_id, room_name, engine, seed, options):
+        self.task_id = task_id
+        self.room_name = room_name
+        self.engine = engine
+        self.seed = seed
+        self.options = options
+        self.status = PENDING
+        self.attempts = 0
+        self.worker = None
+        self.deadline = None
+        self.energy = None
+
+
+class RoomEntry:
+    """A room of the coordinator: compiled room, target energy and best placement."""
+
+    def __init__(self, compiled, target_energy):
+        self.compiled = compiled
+        self.target_energy = target_energy
+        self.best_state = None
+        self.best_energy = math.inf
+        self.best_task = None
+
+    @property
+    def solved(self):
+        return self.best_energy <= self.target_energy
+
+
+class SolveCoordinator:
+    """
+    Coordinator of a pool of workers solving rooms over TCP.
+
+    Tasks (room, engine, seed) are queued with `submit` and handed out to
+    the workers that ask for one, together with the compiled room. A task
+    handed out is leased: the worker renews the lease with a heartbeat at
+    least every `heartbeat_interval` seconds while it runs, and a task
+    whose lease runs out or whose worker disconnects goes back to the
+    queue, up to `max_attempts` times. The best placement of every room is
+    kept, and once a room reaches its target energy its queued tasks are
+    cancelled and its running tasks are told to stop at their next
+    heartbeat.
+
+    Messages are pickled tuples over `multiprocessing.connection`, with an
+    HMAC handshake on `authkey`, and every worker message gets one reply.
+    """
+
+    def __init__(self, address=("localhost", 0), authkey=None, lease_time=30, max_attempts=3):
+        self.authkey = authkey or os.urandom(16)
+        self.listener = Listener(address, authkey=self.authkey)
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.rooms = {}
+        self.tasks = {}
+        self.queue = []
+        self.task_ids = itertools.count()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.workers = 0
+
+    @property
+    def address(self):
+        return self.listener.address
+
+    def add_room(self, name, room_width, room_height, doors, furniture_dict, target_energy=0):
+        """Add a room, referred to by name in `submit`."""
+        with self.condition:
+            self.rooms[name] = RoomEntry(compile_room(room_width, room_height, doors, furniture_dict), target_energy)
+
+    def submit(self, room_name, engine, seed, options=None):
+        """Queue a task and return its id."""
+        if engine not in ENGINES:
+            raise ValueError("engine must be one of %s" % ", ".join(ENGINES))
+        with self.condition:
+            task = Task(next(self.task_ids), room_name, engine, seed, {**DEFAULT_OPTIONS, **(options or {})})
+            self.tasks[task.task_id] = task
+            if self.rooms[room_name].solved:
+                task.status = CANCELLED
+            else:
+                self.queue.append(task.task_id)
+            self.condition.notify_all()
+            return task.task_id
+
+    def finished(self):
+        return bool(self.tasks) and all(task.status in (DONE, CANCELLED, FAILED) for task in self.tasks.values())
+
+    def requeue(self, task, reason):
+        """Put a lost task back in the queue, or give up on it."""
+        task.worker = task.deadline = None
+        if self.rooms[task.room_name].solved:
+            task.status = CANCELLED
+        elif task.attempts >= self.max_attempts:
+            task.status = FAILED
+            print("Task %d failed: %s, %d attempts" % (task.task_id, reason, task.attempts))
+        else:
+            task.status = PENDING
+            self.queue.append(task.task_id)
+            print("Task %d requeued: %s" % (task.task_id, reason))
+        self.condition.notify_all()
+
+    def cancel_room(self, room_name):
+        """Cancel the queued tasks of a solved room."""
+        for task_id in [task_id for task_id in self.queue if self.tasks[task_id].room_name == room_name]:
+            self.queue.remove(task_id)
+            self.tasks[task_id].status = CANCELLED
+
+    def handle(self, message, worker):
+        """Reply to a message of a worker."""
+        kind = message[0]
+        if kind == "request":
+            if self.stopping:
+                return ("stop",)
+            if self.queue:
+                task = self.tasks[self.queue.pop(0)]
+                task.status = RUNNING
+                task.attempts += 1
+                task.worker = worker
+                task.deadline = time.monotonic() + self.lease_time
+                room = self.rooms[task.room_name]
+                return ("task", task.task_id, task.room_name, room.compiled, task.engine, task.seed,
+                        room.target_energy, task.options)
+            if self.finished():
+                return ("stop",)
+            return ("wait", 0.5)
+        task = self.tasks[message[1]]
+        if kind == "heartbeat":
+            if (self.stopping or task.status != RUNNING or task.worker != worker
+                    or self.rooms[task.room_name].solved):
+                return ("cancel",)
+            task.deadline = time.monotonic() + self.lease_time
+            return ("continue",)
+        if kind == "result":
+            _, _, state, energy = message
+            room = self.rooms[task.room_name]
+            if state is not None and energy < room.best_energy:
+                room.best_state, room.best_energy, room.best_task = state, energy, task.task_id
+            if task.status != DONE:
+                # A late result of an expired lease still completes the task:
+                # drop its requeued copy, a running one is cancelled on its
+                # next heartbeat
+                if task.task_id in self.queue:
+                    self.queue.remove(task.task_id)
+                task.status = DONE
+                task.energy = energy
+                task.worker = task.deadline = None
+            if room.solved:
+                self.cancel_room(task.room_name)
+            self.condition.notify_all()
+            return ("ok",)
+        raise RuntimeError('Unknown message "%s"' % kind)
+
+    def serve_worker(self, connection, worker):
+        """Answer a worker until it disconnects, then requeue its tasks."""
+        try:
+            while True:
+                message = connection.recv()
+                with self.condition:
+                    reply = self.handle(message, worker)
+                connection.send(reply)
+                if reply[0] == "stop":
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+            with self.condition:
+                self.workers -= 1
+                for task in self.tasks.values():
+                    if task.status == RUNNING and task.worker == worker:
+                        self.requeue(task, "worker %d disconnected" % worker)
+                self.condition.notify_all()
+
+    def accept_workers(self):
+        for worker in itertools.count():
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                # Listener closed
+                return
+            except Exception:
+                # Failed handshake
+                continue
+            with self.condition:
+                self.workers += 1
+            threading.Thread(target=self.serve_worker, args=(connection, worker), daemon=True).start()
+
+    def run(self, timeout=None):
+        """
+        Serve the workers until every task is done, cancelled or failed,
+        or until the timeout. After the timeout no task is handed out and
+        running tasks are told to stop at their next heartbeat. Returns
+        {room name: (best state, best energy)}.
+        """
+        if not self.tasks:
+            raise ValueError("No tasks submitted")
+        start = time.monotonic()
+        threading.Thread(target=self.accept_workers, daemon=True).start()
+        with self.condition:
+            while not self.finished():
+                if timeout is not None and time.monotonic() - start > timeout:
+                    break
+                now = time.monotonic()
+                for task in self.tasks.values():
+                    if task.status == RUNNING and task.deadline < now:
+                        self.requeue(task, "lease expired")
+                self.condition.wait(0.5)
+            self.stopping = True
+            # Let the connected workers ask for a task and be told to stop
+            self.condition.wait_for(lambda: self.workers == 0, timeout=2 * self.lease_time)
+            results = {name: (room.best_state, room.best_energy) for name, room in self.rooms.items()}
+        self.listener.close()
+        return results
+
+
+class LocalRoom:
+    """
+    Room tables and door penalty maps of a compiled room received by a
+    worker, with the interface of `room.shared.SharedRoom` used by the
+    portfolio engines.
+    """
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.tables = read_tables(compiled)
+        self.door_maps = door_penalty_maps(self.tables)
+
+    def room(self):
+        return read_room(self.compiled)
+
+
+class TaskIncumbent:
+    """Best placement of a task, with the interface of `room.shared.SharedIncumbent`."""
+
+    def __init__(self):
+        self.state = None
+        self.energy = math.inf
+
+    def read(self):
+        return self.state, self.energy
+
+    def publish(self, state, energy, source=0):
+        if energy >= self.energy:
+            return False
+        self.state = decode_state(state) if isinstance(state, np.ndarray) else list(state)
+        self.energy = energy
+        return True
+
+
+class TaskContext:
+    """
+    Context of a portfolio engine running a task on a worker. The engine
+    is done when the task reaches the target energy or its time limit, or
+    when the coordinator cancels it. The coordinator is asked at most once
+    every `heartbeat_interval` seconds, which also renews the lease.
+    """
+
+    def __init__(self, connection, task_id, shared_room, target_energy, options, heartbeat_interval=1.0):
+        self.connection = connection
+        self.task_id = task_id
+        self.shared_room = shared_room
+        self.room = shared_room.room()
+        self.incumbent = TaskIncumbent()
+        self.target_energy = target_energy
+        self.options = options
+        self.heartbeat_interval = heartbeat_interval
+        self.start = self.heartbeat = time.monotonic()
+        self.cancelled = False
+
+    def done(self):
+        now = time.monotonic()
+        if not self.cancelled and now - self.heartbeat >= self.heartbeat_interval:
+            self.heartbeat = now
+            self.connection.send(("heartbeat", self.task_id, self.incumbent.energy))
+            self.cancelled = self.connection.recv()[0] == "cancel"
+        return (
+            self.cancelled
+            or self.incumbent.energy <= self.target_energy
+            or now - self.start > self.options["time_limit"]
+        )
+
+    def publish(self, state, energy):
+        self.incumbent.publish(state, energy)
+
+
+def run_worker(address, authkey, heartbeat_interval=1.0):
+    """
+    Ask the coordinator at address for tasks and run them until it says
+    to stop or goes away. Rooms are kept between the tasks of a room.
+    """
+    rooms = {}
+    try:
+        connection = Client(address, authkey=authkey)
+    except ConnectionRefusedError:
+        return
+    with connection:
+        try:
+            while True:
+                connection.send(("request",))
+                message = connection.recv()
+                if message[0] == "stop":
+                    break
+                if message[0] == "wait":
+                    time.sleep(message[1])
+                    continue
+                _, task_id, room_name, compiled, engine, seed, target_energy, options = message
+                if room_name not in rooms or rooms[room_name].compiled != compiled:
+                    rooms[room_name] = LocalRoom(compiled)
+                random.seed(seed)
+                context = TaskContext(connection, task_id, rooms[room_name], target_energy, options, heartbeat_interval)
+                ENGINES[engine](context)
+                state, energy = context.incumbent.read()
+                connection.send(("result", task_id, state, energy))
+                connection.recv()
+        except (EOFError, OSError):
+            # The coordinator is gone
+            pass
+
+
+class LocalCluster:
+    """
+    Coordinator and `workers` worker processes on this machine, talking
+    over the loopback interface exactly like on several nodes. Use as a
+    context manager: the workers are started on entering, and terminated
+    on leaving if they are still running.
+    """
+
+    def __init__(self, workers=None, lease_time=30, max_attempts=3, heartbeat_interval=1.0):
+        self.coordinator = SolveCoordinator(("localhost", 0), lease_time=lease_time, max_attempts=max_attempts)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.heartbeat_interval = heartbeat_interval
+        self.processes = []
+
+    def __enter__(self):
+        self.processes = [
+            multiprocessing.Process(
+                target=run_worker, args=(self.coordinator.address, self.coordinator.authkey, self.heartbeat_interval)
+            )
+            for _ in range(self.workers)
+        ]
+        for process in self.processes:
+            process.start()
+        return self
+
+    def __exit__(self, *exc):
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        self.coordinator.listener.close()
+
+    def run(self, timeout=None):
+        return self.coordinator.run(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve rooms on a pool of workers over TCP")
+    subparsers = parser.add_subparsers(dest="role", required=True)
+    coordinator_parser = subparsers.add_parser("coordinator", help="Queue the tasks and collect the results")
+    coordinator_parser.add_argument(
+        "-c",
+        "--configs",
+        nargs="+",
+        required=True,
+        help="Paths to the room configuration YAML files",
+    )
+    coordinator_parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(ENGINES),
+        default=["annealing"],
+        help="Engines run on every room (default: annealing)",
+    )
+    coordinator_parser.add_argument(
+        "--seeds",
+        type=int,
+        default=4,
+        help="Seeds run per room and engine (default: 4)",
+    )
+    coordinator_parser.add_argument(
+        "--bind",
+        type=str,
+        default="localhost:6000",
+        help="Address the workers connect to (default: localhost:6000)",
+    )
+    coordinator_parser.add_argument(
+        "--local_workers",
+        type=int,
+        default=0,
+        help="Workers started on this machine, with --bind ignored (default: 0)",
+    )
+    coordinator_parser.add_argument(
+        "--time_limit",
+        type=float,
+        default=DEFAULT_OPTIONS["time_limit"],
+        help="Time limit of a task in seconds (default: %s)" % DEFAULT_OPTIONS["time_limit"],
+    )
+    coordinator_parser.add_argument(
+        "--lease_time",
+        type=float,
+        default=30,
+        help="Seconds without heartbeat after which a task is requeued (default: 30)",
+    )
+    coordinator_parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=None,
+        help="JSON file of the best placement of every room",
+    )
+    worker_parser = subparsers.add_parser("worker", help="Run the tasks of a coordinator")
+    worker_parser.add_argument(
+        "--connect",
+        type=str,
+        default="localhost:6000",
+        help="Address of the coordinator (default: localhost:6000)",
+    )
+    for subparser in (coordinator_parser, worker_parser):
+        subparser.add_argument(
+            "--authkey",
+            type=str,
+            default=os.environ.get("ROOM_AUTHKEY"),
+            help="Shared secret of the coordinator and the workers (default: $ROOM_AUTHKEY)",
+        )
+    args = parser.parse_args()
+
+    if args.role == "worker":
+        if not args.authkey:
+            parser.error("--authkey or $ROOM_AUTHKEY is required")
+        print("Worker %s:%d connecting to %s" % (socket.gethostname(), os.getpid(), args.connect))
+        run_worker(parse_address(args.connect), args.authkey.encode())
+        return
+
+    if args.local_workers:
+        cluster = LocalCluster(args.local_workers, args.lease_time)
+    else:
+        if not args.authkey:
+            parser.error("--authkey or $ROOM_AUTHKEY is required")
+        cluster = None
+    coordinator = cluster.coordinator if cluster else SolveCoordinator(
+        parse_address(args.bind), args.authkey.encode(), args.lease_time
+    )
+    for config_file in args.configs:
+        coordinator.add_room(config_file, *load_room_config(config_file))
+        for engine in args.engines:
+            for seed in range(args.seeds):
+                coordinator.submit(config_file, engine, seed, {"time_limit": args.time_limit})
+    print("Coordinator listening on %s:%d, %d tasks" % (*coordinator.address, len(coordinator.tasks)))
+    if cluster:
+        with cluster:
+            results = cluster.run()
+    else:
+        results = coordinator.run()
+    for config_file, (state, energy) in results.items():
+        print("%s: best energy %s" % (config_file, energy))
+    if args.output:
+        with open(args.output, "w") as file:
+            # Rooms without a placement have infinite energy, not valid JSON
+            json.dump(
+                {
+                    name: {"state": state, "energy": energy if math.isfinite(energy) else None}
+                    for name, (state, energy) in results.items()
+                },
+                file,
+                indent=2,
+            )
+        print("Best placements saved as '%s'" % args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ WALL_PENALTY = 50
 DOOR_PENALTY = 100
 PENALTY_DISTANCE_MULTIPLIER = 10
 NOT_FACE_TO_FACE_PENALTY = 100
+# Penalty per unit of overlapped area, used instead of OVERLAP_PENALTY by the area objective
+OVERLAP_AREA_PENALTY = 20
 
 
 class Orientation(StrEnum):
@@ -84,21 +86,12 @@ def objective(state, furniture_dict, room_width, room_height, doors):
                 for j, (x2, y2, orientation2) in enumerate(state)
                 if list(furniture_dict.keys())[j] == nearby_furniture_name
             )
-            distance = furniture_distance(
+            energy += nearby_penalty(
                 furniture,
                 furniture_dict[nearby_furniture_name],
                 (x, y, orientation),
                 (nearby_x, nearby_y, nearby_orientation),
             )
-            if distance > 0.5:
-                energy += distance * PENALTY_DISTANCE_MULTIPLIER
-            if not furniture_face_to_face(
-                furniture,
-                furniture_dict[nearby_furniture_name],
-                (x, y, orientation),
-                (nearby_x, nearby_y, nearby_orientation),
-            ):
-                energy += NOT_FACE_TO_FACE_PENALTY
         # Penalty for being in front of a door
         for door in doors:
             if door_furniture_overlap(door, furniture, (x, y), room_width, room_height):
@@ -340,3 +333,72 @@ def bbox_overlaps(bbox1, bbox2):
     if x2_1 <= x1_2 or x2_2 <= x1_1 or y2_1 <= y1_2 or y2_2 <= y1_1:
         return False
     return True
+
+
+def local_move_furniture(state, furniture, index, room_width, room_height, radius=1):
+    """
+    Randomly nudge a piece of furniture by at most `radius` units along each axis.
+    """
+    x, y, orientation = state[index]
+    x = random.randint(max(0, x - radius), min(room_width - furniture.width, x + radius))
+    y = random.randint(max(0, y - radius), min(room_height - furniture.height, y + radius))
+    state[index] = (x, y, orientation)
+    return state
+
+
+def local_room_change(state, furniture_dict, room_width, room_height, doors, radius=1):
+    """
+    Randomly select a piece of furniture and nudge it to a nearby position.
+    """
+    furniture_names = list(furniture_dict.keys())
+    index = random.randint(0, len(furniture_names) - 1)
+    furniture: Furniture = furniture_dict[furniture_names[index]]
+    return local_move_furniture(state, furniture, index, room_width, room_height, radius)
+
+
+def nearby_penalty(furniture1: Furniture, furniture2: Furniture, state1, state2):
+    """
+    Penalty for furniture1 not being near and facing furniture2, its nearby furniture.
+    """
+    energy = 0
+    distance = furniture_distance(furniture1, furniture2, state1, state2)
+    if distance > 0.5:
+        energy += distance * PENALTY_DISTANCE_MULTIPLIER
+    if not furniture_face_to_face(furniture1, furniture2, state1, state2):
+        energy += NOT_FACE_TO_FACE_PENALTY
+    return energy
+
+
+def furniture_penalty(state, index, furniture_dict, room_width, room_height, doors):
+    """
+    Part of the objective function involving the piece of furniture at index:
+    its wall and door penalties, its overlaps with the other pieces and the
+    nearby preferences it takes part in. Moving a single piece changes the
+    objective function exactly by the change of its penalty.
+    """
+    names = list(furniture_dict.keys())
+    name = names[index]
+    furniture: Furniture = furniture_dict[name]
+    placement = state[index]
+    energy = 0
+    if furniture.preferred_on_wall and not furniture_on_wall(
+        furniture, placement, room_width, room_height
+    ):
+        energy += WALL_PENALTY * len(state)
+    for door in doors:
+        if door_furniture_overlap(door, furniture, placement[:2], room_width, room_height):
+            energy += DOOR_PENALTY
+    for nearby_furniture_name in furniture.nearby_furniture:
+        j = names.index(nearby_furniture_name)
+        energy += nearby_penalty(furniture, furniture_dict[nearby_furniture_name], placement, state[j])
+    for j, other_placement in enumerate(state):
+        if j == index:
+            continue
+        other = furniture_dict[names[j]]
+        # Overlaps are counted once from each piece
+        if furniture_overlaps(furniture, other, placement, other_placement):
+            energy += 2 * OVERLAP_PENALTY
+        for nearby_furniture_name in other.nearby_furniture:
+            if nearby_furniture_name == name:
+                energy += nearby_penalty(other, furniture, other_placement, placement)
+    return energy
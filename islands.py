@@ -0,0 +1,195 @@
+import multiprocessing
+import queue
+import sys
+import time
+
+import numpy as np
+
+from room.algos.utils import time_string
+from room.shared import SharedIncumbent, SharedRoom
+from room.vectorized import FurniturePlacementVectorizedBeamSearch
+
+TOPOLOGIES = ("ring", "random")
+
+
+def island_targets(island, islands, topology, rng):
+    """Islands receiving the migrants of an island."""
+    if islands < 2:
+        return []
+    if topology == "ring":
+        return [(island + 1) % islands]
+    if topology == "random":
+        return [int(rng.choice([i for i in range(islands) if i != island]))]
+    raise RuntimeError('No implementation found for the topology "%s"' % topology)
+
+
+def evolve_island(island, options, room_name, incumbent_name, n, lock, inboxes, seed):
+    """
+    Evolve the population of one island in its own process.
+
+    Every `migration_interval` generations the best `migrants` assignments
+    are sent to the neighbouring islands and the migrants received so far
+    replace the worst assignments. Every improvement is published to the
+    shared incumbent, and the island stops as soon as any island reaches
+    the acceptable fitness.
+    """
+    room = SharedRoom.attach(room_name)
+    incumbent = SharedIncumbent.attach(incumbent_name, n, lock)
+    rng = np.random.default_rng(seed)
+    beam_search = FurniturePlacementVectorizedBeamSearch.from_tables(
+        room.tables,
+        room.door_maps,
+        population_size=options["population_size"],
+        temperature=options["temperatures"][island],
+        max_generations=options["max_generations"],
+        acceptable_fitness=options["acceptable_fitness"],
+        seed=rng.integers(2 ** 32),
+    )
+    population_size = beam_search.population_size
+    migrants = min(options["migrants"], population_size // 2)
+    best_energy = np.inf
+    for generation in range(options["max_generations"] + 1):
+        beam_search.fitness_population(beam_search.population, out=beam_search.fitnesses)
+        if generation and generation % options["migration_interval"] == 0 and migrants:
+            order = np.argsort(beam_search.fitnesses)
+            for target in island_targets(island, len(inboxes), options["topology"], rng):
+                inboxes[target].put(
+                    (beam_search.population[order[:migrants]].copy(), beam_search.fitnesses[order[:migrants]].copy())
+                )
+            worst = order[::-1]
+            filled = 0
+            while filled < population_size - migrants:
+                try:
+                    assignments, fitnesses = inboxes[island].get_nowait()
+                except queue.Empty:
+                    break
+                count = min(len(assignments), population_size - migrants - filled)
+                beam_search.population[worst[filled : filled + count]] = assignments[:count]
+                beam_search.fitnesses[worst[filled : filled + count]] = fitnesses[:count]
+                filled += count
+        best = int(np.argmin(beam_search.fitnesses))
+        if beam_search.fitnesses[best] < best_energy:
+            best_energy = beam_search.fitnesses[best]
+            incumbent.publish(beam_search.population[best], float(best_energy))
+        if incumbent.energy <= options["acceptable_fitness"] or generation == options["max_generations"]:
+            break
+        beam_search.step()
+
+    # Unread migrants must not keep this process alive
+    for inbox in inboxes:
+        inbox.cancel_join_thread()
+    beam_search = None
+    incumbent.close()
+    room.close()
+
+
+class IslandBeamSearch:
+    """
+    Island model of the vectorized beam search.
+
+    `islands` populations of `population_size` assignments evolve in
+    separate processes that share the room tables through shared memory.
+    Island i starts at temperature * temperature_spread ** (i / (islands - 1)),
+    so hot islands keep exploring while cold ones refine, and every
+    `migration_interval` generations each island sends its best `migrants`
+    assignments to its neighbour on a ring, or to a random island, where
+    they replace the worst ones.
+    """
+
+    def __init__(
+        self,
+        room_width,
+        room_height,
+        doors,
+        furniture_dict,
+        islands=None,
+        population_size=100,
+        temperature=100,
+        max_generations=1000,
+        acceptable_fitness=0,
+        migration_interval=10,
+        migrants=2,
+        topology="ring",
+        temperature_spread=0.1,
+        seed=None,
+    ):
+        if topology not in TOPOLOGIES:
+            raise ValueError("topology must be one of %s" % ", ".join(TOPOLOGIES))
+        self.room = (room_width, room_height, doors, furniture_dict)
+        self.islands = islands or multiprocessing.cpu_count()
+        self.population_size = population_size
+        self.temperature = temperature
+        self.max_generations = max_generations
+        self.acceptable_fitness = acceptable_fitness
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.topology = topology
+        self.temperature_spread = temperature_spread
+        self.seed = seed
+
+    def temperatures(self):
+        if self.islands == 1:
+            return [self.temperature]
+        return [
+            self.temperature * self.temperature_spread ** (i / (self.islands - 1))
+            for i in range(self.islands)
+        ]
+
+    def run(self):
+        """
+        Run the islands and return the best placement as a list of tuples.
+        """
+        self.start = time.time()
+        options = {
+            "population_size": self.population_size,
+            "temperatures": self.temperatures(),
+            "max_generations": self.max_generations,
+            "acceptable_fitness": self.acceptable_fitness,
+            "migration_interval": self.migration_interval,
+            "migrants": self.migrants,
+            "topology": self.topology,
+        }
+        room = SharedRoom.create(*self.room)
+        lock = multiprocessing.Lock()
+        incumbent = SharedIncumbent.create(len(self.room[3]), lock)
+        inboxes = [multiprocessing.Queue() for _ in range(self.islands)]
+        seeds = np.random.SeedSequence(self.seed).spawn(self.islands)
+        processes = [
+            multiprocessing.Process(
+                target=evolve_island,
+                args=(island, options, room.name, incumbent.name, len(self.room[3]), lock, inboxes, seeds[island]),
+            )
+            for island in range(self.islands)
+        ]
+        try:
+            for process in processes:
+                process.start()
+            while any(process.is_alive() for process in processes):
+                self.update(incumbent.energy)
+                time.sleep(0.2)
+            for process in processes:
+                process.join()
+            best_state, best_energy = incumbent.read()
+            if best_state is None:
+                raise RuntimeError(
+                    "No island published a placement, exit codes %s" % [process.exitcode for process in processes]
+                )
+            failed = sum(process.exitcode != 0 for process in processes)
+            if failed:
+                print("\nWarning: %d islands exited with an error" % failed)
+            self.update(best_energy)
+            print("\nIslands finished, best energy", best_energy)
+            return best_state
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            incumbent.close()
+            room.close()
+
+    def update(self, best):
+        """Outputs the best energy found by all the islands to stderr."""
+        print('\r{Islands:8d} islands  best {Best:12.2f}   {Elapsed:s}'
+              .format(Islands=self.islands, Best=best, Elapsed=time_string(time.time() - self.start)),
+              file=sys.stderr, end="")
+        sys.stderr.flush()
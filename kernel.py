@@ -0,0 +1,266 @@
+import abc
+import math
+import random
+import time
+
+import numpy as np
+
+from room.annealing import FurniturePlacementAnnealer
+from room.functions import (
+    OVERLAP_PENALTY,
+    WALL_PENALTY,
+    Orientation,
+    bbox_overlaps,
+    furniture_on_wall,
+    furniture_to_bbox,
+    nearby_penalty,
+)
+from room.vectorized import RoomTables, door_penalty_maps
+
+# Orientations a piece can be rotated to, by current orientation
+ROTATIONS = {
+    orientation: [o for o in Orientation if o != orientation]
+    for orientation in [None, *Orientation]
+}
+
+
+class BlockAnnealingMixin(abc.ABC):
+    """
+    Block annealing for subclasses of `Annealer` that can draw moves in
+    bulk and score a move without applying it. Inherit it before the
+    annealer class and implement the three hooks below.
+    """
+
+    @abc.abstractmethod
+    def draw_moves(self, count):
+        """Draw the next `count` moves at once, for `anneal_blocks`"""
+        pass
+
+    @abc.abstractmethod
+    def evaluate_move(self, move, threshold):
+        """Energy change of a move drawn by `draw_moves`, without applying it.
+        May return None instead once the change is known to exceed
+        `threshold`, the move is then rejected.
+        """
+        pass
+
+    @abc.abstractmethod
+    def commit_move(self, move):
+        """Apply a move whose energy change was just computed by `evaluate_move`"""
+        pass
+
+    def anneal_blocks(self, block_size=1000):
+        """Minimizes the energy of a system by simulated annealing, in
+        blocks of `block_size` steps.
+
+        Follows the same schedule and acceptance rule as `anneal`, but the
+        temperatures of a block are computed at once, and so are the
+        acceptance thresholds -T ln(u): a move is accepted when its energy
+        change is below its threshold. The moves of a block are drawn at
+        once by `draw_moves`, then `evaluate_move` returns the energy change
+        of each move, or None as soon as it knows the change exceeds the
+        threshold, and `commit_move` applies the accepted ones, so no
+        state is copied for rejected moves. Progress is reported, and the
+        energy recomputed, between blocks only.
+
+        Returns
+        (state, energy): the best state and energy found.
+        """
+        step = 0
+        self.start = time.time()
+        if self.Tmin <= 0.0:
+            raise Exception('Exponential cooling requires a minimum "\
+                "temperature greater than zero.')
+        Tfactor = -math.log(self.Tmax / self.Tmin)
+        rng = np.random.default_rng(random.getrandbits(64))
+
+        T = self.Tmax
+        E = self.energy()
+        self.best_state = self.copy_state(self.state)
+        self.best_energy = E
+        trials = accepts = improves = 0
+        if self.updates > 0:
+            updateWavelength = self.steps / self.updates
+            self.update(step, T, E, None, None)
+        if self.trajectory is not None:
+            self.trajectory.start(self.state, E)
+
+        while step < self.steps and not self.user_exit:
+            count = min(block_size, self.steps - step)
+            temperatures = self.Tmax * np.exp(Tfactor * np.arange(step + 1, step + count + 1) / self.steps)
+            thresholds = (-temperatures * np.log(1.0 - rng.random(count))).tolist()
+            moves = self.draw_moves(count)
+            for k in range(count):
+                dE = self.evaluate_move(moves[k], thresholds[k])
+                if dE is not None and dE <= thresholds[k]:
+                    if self.trajectory is not None:
+                        prevState = self.copy_state(self.state)
+                    self.commit_move(moves[k])
+                    E += dE
+                    accepts += 1
+                    if dE < 0.0:
+                        improves += 1
+                        if E < self.best_energy:
+                            self.best_state = self.copy_state(self.state)
+                            self.best_energy = E
+                            if self.target_energy is not None and E <= self.target_energy:
+                                count = k + 1
+                                break
+                    if self.trajectory is not None:
+                        self.trajectory.record(step + k + 1, prevState, self.state, dE)
+            step += count
+            trials += count
+            T = float(temperatures[count - 1])
+            # Incremental energy changes drift, resynchronize once per block
+            E = self.energy()
+            if self.updates > 1:
+                if (step // updateWavelength) > ((step - count) // updateWavelength):
+                    self.update(step, T, E, accepts / trials, improves / trials)
+                    trials = accepts = improves = 0
+            if self.target_energy is not None and self.best_energy <= self.target_energy:
+                break
+
+        self.state = self.copy_state(self.best_state)
+        if self.save_state_on_exit:
+            self.save_state()
+        return self.best_state, self.best_energy
+
+
+class FurniturePlacementKernelAnnealer(BlockAnnealingMixin, FurniturePlacementAnnealer):
+    """
+    Furniture placement annealer for `anneal_blocks`.
+
+    The moves of a block are drawn with NumPy: piece indices, whether to
+    rotate, target coordinates and the uniform that picks the new
+    orientation, with the same distribution as `room_change`. The energy
+    change of a move is the change of the moved piece's penalty, so the
+    objective function is never evaluated in full inside a block.
+
+    The door penalty of every piece at every position is precomputed, so
+    the static part of a penalty (wall and doors) costs a wall test and a
+    lookup. The penalty of every piece is cached, split into its static
+    part and its pair terms with every other piece (overlaps and
+    nearby preferences). The new penalty of a moved piece is accumulated
+    from the cheapest terms to the most expensive ones, and since all the
+    terms are positive the evaluation stops as soon as the energy change
+    exceeds the acceptance threshold: most moves are rejected late in the
+    schedule, and they are rejected without looking at every other piece.
+    """
+
+    copy_strategy = 'slice'
+
+    def __init__(self, room_width, room_height, doors, furniture_dict):
+        super().__init__(room_width, room_height, doors, furniture_dict)
+        self.furnitures = list(furniture_dict.values())
+        names = list(furniture_dict)
+        self.max_x = np.array([room_width - f.width for f in self.furnitures])
+        self.max_y = np.array([room_height - f.height for f in self.furnitures])
+        self.rotatable = np.array([f.front is not None or f.width != f.height for f in self.furnitures])
+        # Pieces sharing a nearby preference with each piece
+        self.partners = [
+            sorted(
+                {names.index(name) for name in f.nearby_furniture}
+                | {j for j, other in enumerate(self.furnitures) if f.name in other.nearby_furniture}
+            )
+            for f in self.furnitures
+        ]
+        self.door_maps = door_penalty_maps(RoomTables(room_width, room_height, doors, furniture_dict))
+        self.rng = np.random.default_rng(random.getrandbits(64))
+        self.aborted = 0
+
+    def static_penalty(self, index, placement):
+        """Wall and door penalties of a piece."""
+        furniture = self.furnitures[index]
+        energy = self.door_maps.item(index, placement[0], placement[1])
+        if furniture.preferred_on_wall and not furniture_on_wall(
+            furniture, placement, self.room_width, self.room_height
+        ):
+            energy += WALL_PENALTY * len(self.state)
+        return energy
+
+    def nearby_pair_penalty(self, i, j, placement):
+        """Nearby preferences between piece i, at placement, and piece j."""
+        a, b = self.furnitures[i], self.furnitures[j]
+        energy = 0
+        if b.name in a.nearby_furniture:
+            energy += nearby_penalty(a, b, placement, self.state[j])
+        if a.name in b.nearby_furniture:
+            energy += nearby_penalty(b, a, self.state[j], placement)
+        return energy
+
+    def reset_cache(self):
+        """Recompute the penalty terms of the current state."""
+        n = len(self.state)
+        self.boxes = [furniture_to_bbox(f, p) for f, p in zip(self.furnitures, self.state)]
+        self.static = [self.static_penalty(i, self.state[i]) for i in range(n)]
+        self.pairs = [[0.0] * n for _ in range(n)]
+        for i in range(n):
+            for j in range(i + 1, n):
+                value = 2 * OVERLAP_PENALTY if bbox_overlaps(self.boxes[i], self.boxes[j]) else 0
+                if j in self.partners[i]:
+                    value += self.nearby_pair_penalty(i, j, self.state[i])
+                self.pairs[i][j] = self.pairs[j][i] = value
+        self.totals = [self.static[i] + sum(self.pairs[i]) for i in range(n)]
+
+    def draw_moves(self, count):
+        # Once per block, so the cached terms never drift
+        self.reset_cache()
+        pieces = self.rng.integers(0, len(self.max_x), size=count)
+        rotate = (self.rng.random(count) < 0.5) & self.rotatable[pieces]
+        xs = self.rng.integers(0, self.max_x[pieces] + 1)
+        ys = self.rng.integers(0, self.max_y[pieces] + 1)
+        choices = self.rng.random(count)
+        return list(zip(pieces.tolist(), rotate.tolist(), xs.tolist(), ys.tolist(), choices.tolist()))
+
+    def candidate_placement(self, move):
+        """New placement of the piece moved by a drawn move."""
+        index, rotate, x, y, choice = move
+        current = self.state[index]
+        if rotate:
+            rotations = ROTATIONS[current[2]]
+            return (current[0], current[1], rotations[int(choice * len(rotations))])
+        return (x, y, current[2])
+
+    def evaluate_move(self, move, threshold):
+        index = move[0]
+        placement = self.candidate_placement(move)
+        # The move is rejected as soon as the new penalty exceeds this
+        limit = self.totals[index] + threshold
+
+        static = self.static_penalty(index, placement)
+        if static > limit:
+            self.aborted += 1
+            return None
+        after = static
+        row = [0.0] * len(self.state)
+        for j in self.partners[index]:
+            value = self.nearby_pair_penalty(index, j, placement)
+            row[j] = value
+            after += value
+        if after > limit:
+            self.aborted += 1
+            return None
+        box = furniture_to_bbox(self.furnitures[index], placement)
+        for j, other_box in enumerate(self.boxes):
+            if j != index and bbox_overlaps(box, other_box):
+                row[j] += 2 * OVERLAP_PENALTY
+                after += 2 * OVERLAP_PENALTY
+                if after > limit:
+                    self.aborted += 1
+                    return None
+        self.candidate = placement, box, static, row
+        return after - self.totals[index]
+
+    def commit_move(self, move):
+        index = move[0]
+        placement, box, static, row = self.candidate
+        pairs = self.pairs[index]
+        for j, value in enumerate(row):
+            if j != index:
+                self.totals[j] += value - pairs[j]
+                self.pairs[j][index] = value
+        self.pairs[index] = row
+        self.static[index] = static
+        self.totals[index] = static + sum(row)
+        self.boxes[index] = box
+        self.state[index] = placement
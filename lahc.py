@@ -0,0 +1,105 @@
+import sys
+import time
+
+from room.algos.annealing import Annealer
+from room.algos.utils import time_string
+from room.annealing import FurniturePlacementAnnealer
+
+
+class LateAcceptanceHillClimbing(Annealer):
+    """
+    Late acceptance hill climbing over the moves of an annealer.
+
+    A move is accepted if the new energy is not worse than the current
+    one, or than the energy the search had `history_length` steps ago.
+    The history is a fixed-size circular array, so besides its length
+    the method has no parameters to tune.
+    """
+
+    # defaults
+    history_length = 1000
+    steps = 100000
+    copy_strategy = 'slice'
+
+    def run(self):
+        """Minimizes the energy of a system by late acceptance hill climbing.
+
+        Returns
+        (state, energy): the best state and energy found.
+        """
+        step = 0
+        self.start = time.time()
+
+        E = self.energy()
+        prevState = self.copy_state(self.state)
+        self.best_state = self.copy_state(self.state)
+        self.best_energy = E
+        history = [E] * self.history_length
+        trials = accepts = improves = 0
+        if self.updates > 0:
+            updateWavelength = self.steps / self.updates
+            self.update(step, E, self.best_energy, None, None)
+
+        while step < self.steps and not self.user_exit:
+            v = step % self.history_length
+            step += 1
+            self.move()
+            newE = self.energy()
+            trials += 1
+            if newE <= E or newE <= history[v]:
+                accepts += 1
+                if newE < E:
+                    improves += 1
+                prevState = self.copy_state(self.state)
+                E = newE
+                if E < self.best_energy:
+                    self.best_state = self.copy_state(self.state)
+                    self.best_energy = E
+            else:
+                self.state = self.copy_state(prevState)
+            history[v] = E
+            if self.updates > 1:
+                if (step // updateWavelength) > ((step - 1) // updateWavelength):
+                    self.update(step, E, self.best_energy, accepts / trials, improves / trials)
+                    trials = accepts = improves = 0
+            if self.target_energy is not None and self.best_energy <= self.target_energy:
+                break
+
+        self.state = self.copy_state(self.best_state)
+        if self.save_state_on_exit:
+            self.save_state()
+        return self.best_state, self.best_energy
+
+    def default_update(self, step, E, best, acceptance, improvement):
+        """Default update, outputs the energy and acceptance rates to stderr."""
+        elapsed = time.time() - self.start
+        if step == 0:
+            print('\n        Step        Energy          Best    Accept   Improve     Elapsed   Remaining',
+                  file=sys.stderr)
+            print('\r{Step:12d}  {Energy:12.2f}  {Best:12.2f}                      {Elapsed:s}            '
+                  .format(Step=step,
+                          Energy=E,
+                          Best=best,
+                          Elapsed=time_string(elapsed)),
+                  file=sys.stderr, end="")
+        else:
+            remain = (self.steps - step) * (elapsed / step)
+            print('\r{Step:12d}  {Energy:12.2f}  {Best:12.2f}   {Accept:7.2%}   {Improve:7.2%}  {Elapsed:s}  {Remaining:s}'
+                  .format(Step=step,
+                          Energy=E,
+                          Best=best,
+                          Accept=acceptance,
+                          Improve=improvement,
+                          Elapsed=time_string(elapsed),
+                          Remaining=time_string(remain)),
+                  file=sys.stderr, end="")
+        sys.stderr.flush()
+
+
+class FurniturePlacementLAHC(LateAcceptanceHillClimbing, FurniturePlacementAnnealer):
+    """
+    Late acceptance hill climbing for furniture placement with the annealer's moves.
+    Stops as soon as a placement without penalties is found.
+    """
+
+    target_energy = 0
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import random
+import sqlite3
+
+import numpy as np
+
+from room.algos.beam import VectorizedBeamSearch
+from room.functions import furniture_to_bbox, objective, room_change
+from room.multiresolution import LocalRefinementAnnealer
+from room.vectorized import encode_state
+
+# Number of doors described by the feature vector, extra doors are ignored
+MAX_DOORS = 4
+
+
+def room_signature(furniture_dict):
+    """
+    Hash of the furniture set. Only rooms with the same signature can share layouts.
+    """
+    description = [
+        (f.name, f.width, f.height, f.front, bool(f.preferred_on_wall), list(f.nearby_furniture))
+        for f in furniture_dict.values()
+    ]
+    return hashlib.sha1(json.dumps(description).encode()).hexdigest()
+
+
+def room_features(room_width, room_height, doors):
+    """
+    Feature vector of a room: its dimensions followed by the wall, relative
+    position and length of each door.
+    """
+    features = np.zeros(2 + 4 * MAX_DOORS)
+    features[:2] = room_width, room_height
+    door_features = []
+    for door in doors:
+        x, y = door.pos
+        if door.is_horizontal:
+            wall = 0 if y == 0 else 1
+            position = x / room_width
+        else:
+            wall = 2 if x == 0 else 3
+            position = y / room_height
+        door_features.append((wall, position, door.length))
+    for k, (wall, position, length) in enumerate(sorted(door_features)[:MAX_DOORS]):
+        # Walls are spaced out so a door on another wall is far away
+        features[2 + 4 * k] = 10 * wall
+        features[3 + 4 * k] = 10 * position
+        features[4 + 4 * k] = length
+        features[5 + 4 * k] = 1
+    return features
+
+
+def rescale_state(state, furniture_dict, room_width, room_height, new_width, new_height):
+    """
+    Scale a placement to a room of different dimensions.
+    Furniture touching a wall keeps touching the same wall.
+    """
+    rescaled = []
+    for (x, y, orientation), furniture in zip(state, furniture_dict.values()):
+        x1, y1, x2, y2 = furniture_to_bbox(furniture, (x, y, orientation))
+        if x2 >= room_width:
+            x = new_width - (x2 - x1)
+        elif x > 0:
+            x = round(x * new_width / room_width)
+        if y2 >= room_height:
+            y = new_height - (y2 - y1)
+        elif y > 0:
+            y = round(y * new_height / room_height)
+        x = min(max(x, 0), new_width - furniture.width)
+        y = min(max(y, 0), new_height - furniture.height)
+        rescaled.append((x, y, orientation))
+    return rescaled
+
+
+def repair_state(state, room_width, room_height, doors, furniture_dict, steps=2000):
+    """
+    Fix the violations left by rescaling with a short low-temperature
+    annealing that only nudges furniture.
+    """
+    annealer = LocalRefinementAnnealer(room_width, room_height, doors, furniture_dict, state)
+    annealer.set_schedule({'tmax': 50, 'tmin': 0.1, 'steps': steps, 'updates': 0})
+    return annealer.anneal()
+
+
+class SolutionLibrary:
+    """
+    Persistent library of solved rooms stored in SQLite.
+
+    Layouts are indexed by the signature of the furniture set, and among
+    rooms with the same furniture the closest one by feature vector is
+    used to seed the solvers.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS solutions ("
+            "id INTEGER PRIMARY KEY, signature TEXT, features BLOB, "
+            "room_width INTEGER, room_height INTEGER, state TEXT, energy REAL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS solutions_signature ON solutions (signature)"
+        )
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, room_width, room_height, doors, furniture_dict, state, energy):
+        """Store a solved layout"""
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO solutions (signature, features, room_width, room_height, state, energy) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    room_signature(furniture_dict),
+                    room_features(room_width, room_height, doors).tobytes(),
+                    room_width,
+                    room_height,
+                    json.dumps([(x, y, orientation) for x, y, orientation in state]),
+                    float(energy),
+                ),
+            )
+
+    def nearest(self, room_width, room_height, doors, furniture_dict):
+        """
+        Find the stored room closest to the given one.
+        Returns (room_width, room_height, state, energy, distance), or None
+        when no room with the same furniture has been solved.
+        """
+        rows = self.connection.execute(
+            "SELECT features, room_width, room_height, state, energy FROM solutions WHERE signature = ?",
+            (room_signature(furniture_dict),),
+        ).fetchall()
+        if not rows:
+            return None
+        features = np.frombuffer(b"".join(row[0] for row in rows)).reshape(len(rows), -1)
+        distances = np.linalg.norm(features - room_features(room_width, room_height, doors), axis=1)
+        # Closest room first, lowest energy among equally close rooms
+        best = min(range(len(rows)), key=lambda k: (distances[k], rows[k][4]))
+        _, width, height, state, energy = rows[best]
+        state = [tuple(placement) for placement in json.loads(state)]
+        return width, height, state, energy, distances[best]
+
+    def seed(self, room_width, room_height, doors, furniture_dict, repair_steps=2000):
+        """
+        Initial state for the given room built from the closest stored layout,
+        rescaled and repaired. Returns None if no stored layout matches.
+        """
+        match = self.nearest(room_width, room_height, doors, furniture_dict)
+        if match is None:
+            return None
+        width, height, state, _, _ = match
+        state = rescale_state(state, furniture_dict, width, height, room_width, room_height)
+        if objective(state, furniture_dict, room_width, room_height, doors) > 0 and repair_steps > 0:
+            state, _ = repair_state(state, room_width, room_height, doors, furniture_dict, repair_steps)
+        return state
+
+
+def seed_beam_search(beam_search, state, furniture_dict, room_width, room_height, doors, fraction=0.5):
+    """
+    Replace a fraction of the beam search population with the seed state
+    and random variations of it.
+    """
+    count = max(1, int(len(beam_search.population) * fraction))
+    seeds = [list(state)]
+    for _ in range(count - 1):
+        seed = list(state)
+        for _ in range(random.randint(1, 3)):
+            seed = room_change(seed, furniture_dict, room_width, room_height, doors)
+        seeds.append(seed)
+    if isinstance(beam_search, VectorizedBeamSearch):
+        beam_search.population[:count] = np.stack([encode_state(seed) for seed in seeds])
+    else:
+        beam_search.population[:count] = seeds
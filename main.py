@@ -1,49 +1,72 @@
-import yaml
 import argparse
 
+from room.adaptive import AdaptiveFurniturePlacementAnnealer
 from room.annealing import FurniturePlacementAnnealer
 from room.beam import FurniturePlacementBeamSearch
-from room.functions import Furniture, Door
-from room.visualize import draw_room, print_room
-
-
-def load_room_config(config_file):
-    """Load room configuration from a YAML file."""
-    with open(config_file) as file:
-        config = yaml.load(file, Loader=yaml.FullLoader)
-    room_width = config["room_width"]
-    room_height = config["room_height"]
-    doors = [
-        Door(door["name"], door["position"], door["length"], door["is_horizontal"])
-        for door in config["doors"]
-    ]
-    furniture_dict = {
-        furniture["name"]: Furniture(
-            furniture["name"],
-            furniture["width"],
-            furniture["height"],
-            furniture["color"],
-            furniture.get("preferred_on_wall"),
-            furniture.get("nearby_furniture", []),
-            furniture.get("front", None),
-        )
-        for furniture in config["furnitures"]
-    }
-    return room_width, room_height, doors, furniture_dict
+from room.bounds import lower_bound
+from room.config import load_room_config
+from room.islands import TOPOLOGIES, IslandBeamSearch
+from room.kernel import FurniturePlacementKernelAnnealer
+from room.lahc import FurniturePlacementLAHC
+from room.library import SolutionLibrary, seed_beam_search
+from room.multiresolution import solve_multiresolution
+from room.occupancy import FurniturePlacementOccupancyAnnealer
+from room.portfolio import ENGINES, PortfolioSolver
+from room.tabu import FurniturePlacementTabuSearch
+from room.trajectory import TrajectoryRecorder
+from room.tuning import load_tuned_defaults
+from room.vectorized import FurniturePlacementVectorizedBeamSearch
+from room.visualize import LayoutRenderer, animate, draw_room, ffmpeg_available, print_room, sample_trajectory
 
 
-def run_annealing(room_width, room_height, doors, furniture_dict, duration, tmax=5000, tmin=0.001, steps=10000, auto=False):
+def run_annealing(room_width, room_height, doors, furniture_dict, *, duration, tmax=5000, tmin=0.001, steps=10000, auto=False, levels=1, trajectory=None, animation=None, initial_state=None, adaptive=False, target_energy=None, blocks=False, overlap_area=False):
     """Run simulated annealing to find the best furniture placement."""
-    annealer = FurniturePlacementAnnealer(
+    if levels > 1:
+        schedule = {'tmax': tmax, 'tmin': tmin, 'steps': steps, 'updates': 100}
+        refine_schedule = {'tmax': tmax / 100, 'tmin': tmin, 'steps': steps, 'updates': 100}
+        best_state, best_energy = solve_multiresolution(
+            room_width, room_height, doors, furniture_dict, levels, schedule, refine_schedule,
+            initial_state=initial_state, target_energy=target_energy,
+        )
+        return best_state
+    if adaptive:
+        annealer_class = AdaptiveFurniturePlacementAnnealer
+    elif overlap_area:
+        annealer_class = FurniturePlacementOccupancyAnnealer
+        # The lower bound counts overlapping pairs, not overlapped area, but 0 is still a valid target
+        target_energy = min(target_energy, 0) if target_energy is not None else None
+    elif blocks:
+        annealer_class = FurniturePlacementKernelAnnealer
+    else:
+        annealer_class = FurniturePlacementAnnealer
+    annealer = annealer_class(
         room_width, room_height, doors, furniture_dict
     )
+    if initial_state is not None:
+        annealer.state = annealer.copy_state(initial_state)
+    annealer.target_energy = target_energy
     if auto:
         schedule = annealer.auto(minutes=duration)
     else:
         schedule = {'tmax': tmax, 'tmin': tmin, 'steps': steps, 'updates': 100}
+    if initial_state is not None:
+        # Refine the seed instead of scrambling it, like the multiresolution refinement
+        schedule['tmax'] = max(schedule['tmax'] / 100, schedule['tmin'])
     print("\nAnnealing schedule:", schedule)
     annealer.set_schedule(schedule)
-    best_state, best_energy = annealer.anneal()
+    if trajectory or animation:
+        annealer.trajectory = TrajectoryRecorder(annealer.steps, len(furniture_dict))
+    if blocks or overlap_area:
+        best_state, best_energy = annealer.anneal_blocks()
+    else:
+        best_state, best_energy = annealer.anneal()
+    if trajectory:
+        annealer.trajectory.save(trajectory)
+        print("\nTrajectory saved as '%s'" % trajectory)
+    if animation:
+        renderer = LayoutRenderer(room_width, room_height, doors, furniture_dict)
+        animate(renderer, sample_trajectory(annealer.trajectory), animation)
+        print("\nAnimation saved as '%s'" % animation)
     return best_state
 
 
@@ -56,9 +79,31 @@ def run_beam_search(
     temperature,
     max_generations,
     acceptable_error,
+    vectorized=False,
+    crossover="uniform",
+    initial_state=None,
+    islands=1,
+    migration_interval=10,
+    topology="ring",
 ):
     """Run beam search to find the best furniture placement."""
-    beam_search = FurniturePlacementBeamSearch(
+    if islands > 1:
+        island_search = IslandBeamSearch(
+            room_width,
+            room_height,
+            doors,
+            furniture_dict,
+            islands=islands,
+            population_size=population_size,
+            temperature=temperature,
+            max_generations=max_generations,
+            acceptable_fitness=acceptable_error,
+            migration_interval=migration_interval,
+            topology=topology,
+        )
+        return island_search.run()
+    beam_class = FurniturePlacementVectorizedBeamSearch if vectorized else FurniturePlacementBeamSearch
+    beam_search = beam_class(
         room_width,
         room_height,
         doors,
@@ -68,10 +113,60 @@ def run_beam_search(
         max_generations=max_generations,
         acceptable_fitness=acceptable_error
     )
+    if vectorized:
+        beam_search.crossover_strategy = crossover
+    if initial_state is not None:
+        seed_beam_search(beam_search, initial_state, furniture_dict, room_width, room_height, doors)
     best_state = beam_search.run()
     return best_state
 
 
+def run_tabu_search(room_width, room_height, doors, furniture_dict, steps, tenure, neighbourhood, initial_state=None, target_energy=0):
+    """Run tabu search to find the best furniture placement."""
+    tabu_search = FurniturePlacementTabuSearch(room_width, room_height, doors, furniture_dict)
+    if initial_state is not None:
+        tabu_search.state = tabu_search.copy_state(initial_state)
+    tabu_search.steps = steps
+    tabu_search.tenure = tenure
+    tabu_search.neighbourhood = neighbourhood
+    tabu_search.target_energy = target_energy
+    best_state, best_energy = tabu_search.run()
+    return best_state
+
+
+def run_lahc(room_width, room_height, doors, furniture_dict, steps, history_length, initial_state=None, target_energy=0):
+    """Run late acceptance hill climbing to find the best furniture placement."""
+    lahc = FurniturePlacementLAHC(room_width, room_height, doors, furniture_dict)
+    if initial_state is not None:
+        lahc.state = lahc.copy_state(initial_state)
+    lahc.steps = steps
+    lahc.history_length = history_length
+    lahc.target_energy = target_energy
+    best_state, best_energy = lahc.run()
+    return best_state
+
+
+def run_portfolio(room_width, room_height, doors, furniture_dict, engines, duration, tmax, tmin, steps, population_size, max_generations, target_energy=0):
+    """Run several algorithms concurrently, sharing the best furniture placement."""
+    portfolio = PortfolioSolver(
+        room_width,
+        room_height,
+        doors,
+        furniture_dict,
+        engines=engines,
+        time_limit=duration * 60,
+        target_energy=target_energy,
+        tmax=tmax,
+        tmin=tmin,
+        steps=steps,
+        population_size=population_size,
+        max_generations=max_generations,
+    )
+    best_state = portfolio.run()
+    print("Winning engine:", portfolio.winner)
+    return best_state
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Furniture Placement Optimization using Annealing or Beam Search"
@@ -81,9 +176,9 @@ def main():
     parser.add_argument(
         "-a",
         "--algorithm",
-        choices=["annealing", "beamsearch"],
+        choices=["annealing", "beamsearch", "tabu", "lahc", "portfolio"],
         required=True,
-        help="Choose optimization algorithm: 'annealing' or 'beamsearch'",
+        help="Choose optimization algorithm: 'annealing', 'beamsearch', 'tabu', 'lahc' or 'portfolio'",
     )
 
     # Argument for specifying the room configuration file
@@ -124,6 +219,42 @@ def main():
         default=0,
         help="Acceptable error for beam search (default: 0)",
     )
+    parser.add_argument(
+        "--vectorized",
+        action='store_true',
+        help="Keep the beam search population in NumPy arrays and evolve it with array operations",
+    )
+    parser.add_argument(
+        "--crossover",
+        choices=["uniform", "one_point"],
+        default="uniform",
+        help="Crossover of the vectorized beam search (default: uniform)",
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(ENGINES),
+        default=list(ENGINES),
+        help="Algorithms run concurrently by the portfolio (default: all)",
+    )
+    parser.add_argument(
+        "--islands",
+        type=int,
+        default=1,
+        help="Number of beam search populations evolving in parallel processes (default: 1)",
+    )
+    parser.add_argument(
+        "--migration_interval",
+        type=int,
+        default=10,
+        help="Generations between migrations of the best assignments between islands (default: 10)",
+    )
+    parser.add_argument(
+        "--topology",
+        choices=TOPOLOGIES,
+        default="ring",
+        help="Islands receiving the migrants: the next one on a ring or a random one (default: ring)",
+    )
     parser.add_argument(
         "--auto",
         action='store_true',
@@ -145,18 +276,141 @@ def main():
         "--steps",
         type=int,
         default=10000,
-        help="Number of steps for annealing (default: 10000)",
+        help="Number of steps for annealing, tabu search and late acceptance (default: 10000)",
+    )
+    parser.add_argument(
+        "--tenure",
+        type=int,
+        default=20,
+        help="Number of iterations a move stays tabu (default: 20)",
+    )
+    parser.add_argument(
+        "--neighbourhood",
+        type=int,
+        default=20,
+        help="Moves sampled per tabu search iteration (default: 20)",
+    )
+    parser.add_argument(
+        "--history_length",
+        type=int,
+        default=1000,
+        help="History length of late acceptance hill climbing (default: 1000)",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action='store_true',
+        help="Choose annealing moves and pieces adaptively from their recent success and penalty",
+    )
+    parser.add_argument(
+        "--blocks",
+        action='store_true',
+        help="Anneal in blocks of steps with moves and randomness drawn in bulk and incremental energies",
+    )
+    parser.add_argument(
+        "--overlap_area",
+        action='store_true',
+        help="Anneal in blocks with overlaps penalized by overlapped area, tracked on a bitboard occupancy grid",
+    )
+    parser.add_argument(
+        "--levels",
+        type=int,
+        default=1,
+        help="Number of resolution levels for coarse-to-fine annealing (default: 1)",
+    )
+    parser.add_argument(
+        "--trajectory",
+        type=str,
+        default=None,
+        help="Record the accepted annealing moves into this .npz file",
+    )
+    parser.add_argument(
+        "--animation",
+        type=str,
+        default=None,
+        help="Save an animation of the annealing run to this .gif or .mp4 file (requires ffmpeg)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="final_furniture_placement.png",
+        help="Path of the final plot (default: final_furniture_placement.png)",
+    )
+    parser.add_argument(
+        "--library",
+        type=str,
+        default=None,
+        help="SQLite library of solved rooms used to seed the search and extended with the result",
+    )
+    parser.add_argument(
+        "--defaults",
+        type=str,
+        default=None,
+        help="JSON file of tuned settings written by room.tuning, used as defaults for the room's size class",
     )
     args = parser.parse_args()
+    if args.adaptive:
+        for flag in ("blocks", "overlap_area"):
+            if getattr(args, flag):
+                parser.error("--%s cannot be combined with --adaptive" % flag)
+    if args.animation and not ffmpeg_available():
+        parser.error("--animation requires ffmpeg, which was not found")
+    if args.levels > 1:
+        # The levels are annealed by their own plain annealers
+        for flag in ("trajectory", "animation", "adaptive", "blocks", "overlap_area"):
+            if getattr(args, flag):
+                parser.error("--%s cannot be combined with --levels" % flag)
 
     # Load the room configuration
     room_width, room_height, doors, furniture_dict = load_room_config(args.config)
 
+    # Options given on the command line take precedence over the tuned settings
+    if args.defaults:
+        tuned = load_tuned_defaults(args.defaults, furniture_dict, args.algorithm)
+        if tuned:
+            print("Using tuned settings:", tuned)
+            parser.set_defaults(**tuned)
+            args = parser.parse_args()
+
+    # No placement can do better than the lower bound, stop the search when it is reached
+    bound, issues = lower_bound(room_width, room_height, doors, furniture_dict)
+    for issue in issues:
+        print("Warning:", issue)
+    if bound > 0:
+        print("Lower bound of the objective function:", bound)
+
+    # Seed the search with the closest previously solved room
+    library = initial_state = None
+    if args.library:
+        library = SolutionLibrary(args.library)
+        initial_state = library.seed(room_width, room_height, doors, furniture_dict)
+        if initial_state is not None:
+            print("Seeding the search from the solution library")
+            if args.algorithm == "portfolio" or (args.algorithm == "beamsearch" and args.islands > 1):
+                print("Warning: the seed is not used by the portfolio or the islands, the result is still added to the library")
+                initial_state = None
+
     # Run the chosen optimization algorithm
     if args.algorithm == "annealing":
         print("Running Simulated Annealing...")
         best_state = run_annealing(
-            room_width, room_height, doors, furniture_dict, args.duration, args.tmax, args.tmin, args.steps, args.auto
+            room_width,
+            room_height,
+            doors,
+            furniture_dict,
+            duration=args.duration,
+            tmax=args.tmax,
+            tmin=args.tmin,
+            steps=args.steps,
+            auto=args.auto,
+            levels=args.levels,
+            trajectory=args.trajectory,
+            animation=args.animation,
+            initial_state=initial_state,
+            adaptive=args.adaptive,
+            target_energy=bound,
+            blocks=args.blocks,
+            overlap_area=args.overlap_area,
         )
     elif args.algorithm == "beamsearch":
         print("Running Beam Search...")
@@ -165,18 +419,70 @@ def main():
             room_height,
             doors,
             furniture_dict,
-            args.population_size,
-            args.tmax,
-            args.max_generations,
-            args.acceptable_error,
+            population_size=args.population_size,
+            temperature=args.tmax,
+            max_generations=args.max_generations,
+            acceptable_error=max(args.acceptable_error, bound),
+            vectorized=args.vectorized,
+            crossover=args.crossover,
+            initial_state=initial_state,
+            islands=args.islands,
+            migration_interval=args.migration_interval,
+            topology=args.topology,
+        )
+    elif args.algorithm == "tabu":
+        print("Running Tabu Search...")
+        best_state = run_tabu_search(
+            room_width,
+            room_height,
+            doors,
+            furniture_dict,
+            steps=args.steps,
+            tenure=args.tenure,
+            neighbourhood=args.neighbourhood,
+            initial_state=initial_state,
+            target_energy=bound,
+        )
+    elif args.algorithm == "lahc":
+        print("Running Late Acceptance Hill Climbing...")
+        best_state = run_lahc(
+            room_width,
+            room_height,
+            doors,
+            furniture_dict,
+            steps=args.steps,
+            history_length=args.history_length,
+            initial_state=initial_state,
+            target_energy=bound,
+        )
+
+    elif args.algorithm == "portfolio":
+        print("Running Portfolio of %s..." % ", ".join(args.engines))
+        best_state = run_portfolio(
+            room_width,
+            room_height,
+            doors,
+            furniture_dict,
+            engines=args.engines,
+            duration=args.duration,
+            tmax=args.tmax,
+            tmin=args.tmin,
+            steps=args.steps,
+            population_size=args.population_size,
+            max_generations=args.max_generations,
+            target_energy=bound,
         )
 
     # Output results
     print_room(furniture_dict, best_state)
-    draw_room(room_width, room_height, doors, furniture_dict, best_state)
+    draw_room(room_width, room_height, doors, furniture_dict, best_state, args.output)
     from room.functions import objective
-    print("Objective function value:", objective(best_state, furniture_dict, room_width, room_height, doors))
-    print("Plot saved as 'final_furniture_placement.png'")
+    energy = objective(best_state, furniture_dict, room_width, room_height, doors)
+    print("Objective function value:", energy)
+    if library is not None:
+        library.add(room_width, room_height, doors, furniture_dict, best_state, energy)
+        library.close()
+    print("Plot saved as '%s'" % args.output)
 
 
 if __name__ == "__main__":
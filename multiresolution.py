@@ -0,0 +1,142 @@
+import math
+
+from room.annealing import FurniturePlacementAnnealer
+from room.functions import Door, Furniture, local_room_change, objective
+
+
+class LocalRefinementAnnealer(FurniturePlacementAnnealer):
+    """
+    Annealer that only nudges furniture by a few units, used to refine
+    a placement upsampled from a coarser resolution.
+    """
+
+    def __init__(self, room_width, room_height, doors, furniture_dict, initial_state, radius=1):
+        super().__init__(room_width, room_height, doors, furniture_dict)
+        self.state = self.copy_state(initial_state)
+        self.radius = radius
+
+    def move(self):
+        self.state = local_room_change(
+            self.state,
+            self.furniture_dict,
+            self.room_width,
+            self.room_height,
+            self.doors,
+            self.radius,
+        )
+
+
+def resolution_factors(room_width, room_height, furniture_dict, levels):
+    """
+    Return the scale factors (coarsest first, ending with 1) used by the
+    multiresolution pipeline. Factors are powers of two and stop doubling
+    as soon as a piece of furniture would no longer fit in the coarse room.
+    """
+    factors = [1]
+    while len(factors) < levels:
+        factor = factors[-1] * 2
+        coarse_width, coarse_height = room_width // factor, room_height // factor
+        if any(
+            math.ceil(furniture.width / factor) > coarse_width
+            or math.ceil(furniture.height / factor) > coarse_height
+            for furniture in furniture_dict.values()
+        ):
+            break
+        factors.append(factor)
+    return factors[::-1]
+
+
+def scale_coordinate(value, size, coarse_size, factor):
+    """Scale a coordinate down, keeping coordinates on the far wall on the far wall."""
+    return coarse_size if value == size else value // factor
+
+
+def scale_room(room_width, room_height, doors, furniture_dict, factor):
+    """
+    Scale a room configuration down by `factor`.
+
+    The room is rounded down and furniture and door lengths are rounded up,
+    so a coarse layout without overlaps stays without overlaps once upsampled.
+    """
+    if factor == 1:
+        return room_width, room_height, doors, furniture_dict
+    coarse_width, coarse_height = room_width // factor, room_height // factor
+    coarse_doors = []
+    for door in doors:
+        x, y = door.pos
+        start = x if door.is_horizontal else y
+        coarse_x = scale_coordinate(x, room_width, coarse_width, factor)
+        coarse_y = scale_coordinate(y, room_height, coarse_height, factor)
+        coarse_start = coarse_x if door.is_horizontal else coarse_y
+        length = math.ceil((start + door.length) / factor) - coarse_start
+        coarse_doors.append(Door(door.name, (coarse_x, coarse_y), length, door.is_horizontal))
+    coarse_furniture_dict = {
+        name: Furniture(
+            furniture.name,
+            math.ceil(furniture.width / factor),
+            math.ceil(furniture.height / factor),
+            furniture.color,
+            furniture.preferred_on_wall,
+            furniture.nearby_furniture,
+            furniture.front,
+        )
+        for name, furniture in furniture_dict.items()
+    }
+    return coarse_width, coarse_height, coarse_doors, coarse_furniture_dict
+
+
+def upsample_state(state, furniture_dict, room_width, room_height, ratio):
+    """
+    Map a placement onto a room `ratio` times finer, clamping every piece
+    inside the finer room.
+    """
+    upsampled = []
+    for (x, y, orientation), furniture in zip(state, furniture_dict.values()):
+        x = min(x * ratio, room_width - furniture.width)
+        y = min(y * ratio, room_height - furniture.height)
+        upsampled.append((x, y, orientation))
+    return upsampled
+
+
+def solve_multiresolution(
+    room_width, room_height, doors, furniture_dict, levels, schedule, refine_schedule=None,
+    initial_state=None, target_energy=None,
+):
+    """
+    Solve the placement coarse-to-fine.
+
+    The coarsest room is annealed with the full move set and `schedule`,
+    then every finer resolution is refined with local moves only, using
+    `refine_schedule` (defaults to `schedule`). The last level is the native
+    resolution, so the returned state is valid for the original room.
+
+    An `initial_state` is already a native placement: the coarse levels are
+    skipped and it is only refined at the native resolution. The native
+    level stops as soon as it reaches `target_energy`.
+
+    Returns (state, energy) at the native resolution.
+    """
+    refine_schedule = refine_schedule or schedule
+    if initial_state is not None:
+        factors = [1]
+        state, previous_factor = initial_state, 1
+    else:
+        factors = resolution_factors(room_width, room_height, furniture_dict, levels)
+        state, previous_factor = None, None
+    for factor in factors:
+        level_room = scale_room(room_width, room_height, doors, furniture_dict, factor)
+        level_width, level_height, level_doors, level_furniture_dict = level_room
+        if state is None:
+            annealer = FurniturePlacementAnnealer(*level_room)
+            annealer.set_schedule(schedule)
+        else:
+            ratio = previous_factor // factor
+            state = upsample_state(state, level_furniture_dict, level_width, level_height, ratio)
+            annealer = LocalRefinementAnnealer(*level_room, state, radius=ratio)
+            annealer.set_schedule(refine_schedule)
+        if factor == 1:
+            annealer.target_energy = target_energy
+        print("\nResolution 1/%d: room %dx%d" % (factor, level_width, level_height))
+        state, _ = annealer.anneal()
+        previous_factor = factor
+    return state, objective(state, furniture_dict, room_width, room_height, doors)
@@ -0,0 +1,200 @@
+from room.functions import (
+    DOOR_PENALTY,
+    OVERLAP_AREA_PENALTY,
+    WALL_PENALTY,
+    door_furniture_overlap,
+    furniture_on_wall,
+    furniture_to_bbox,
+    nearby_penalty,
+)
+from room.kernel import FurniturePlacementKernelAnnealer
+
+
+def row_mask(x1, x2):
+    """Bits x1 to x2 - 1 of a grid row."""
+    return ((1 << (x2 - x1)) - 1) << x1
+
+
+class OccupancyGrid:
+    """
+    Occupancy of a grid of width x height unit cells, one Python int per
+    row with bit x standing for cell x.
+
+    How many boxes cover each cell is kept as bit-sliced counters: plane k
+    of a row holds bit k of the counts of its cells, so adding or removing
+    a box is a ripple carry of a few AND/XOR operations per row it spans.
+    The overlapped area (the cells covered more than once, counted once
+    per extra box) is a popcount. Boxes are clipped to the grid.
+    """
+
+    def __init__(self, width, height, capacity):
+        self.width = width
+        self.height = height
+        self.planes = [[0] * height for _ in range(max(capacity, 1).bit_length())]
+        self.area = 0
+
+    def rows(self, box):
+        """(row, mask) of every row spanned by a box."""
+        x1, y1, x2, y2 = box
+        x1, x2 = max(x1, 0), min(x2, self.width)
+        if x1 >= x2:
+            return []
+        mask = row_mask(x1, x2)
+        return [(y, mask) for y in range(max(y1, 0), min(y2, self.height))]
+
+    def add(self, box):
+        """Cover the cells of a box once more."""
+        for y, mask in self.rows(box):
+            self.area += mask.bit_count()
+            carry = mask
+            for plane in self.planes:
+                if not carry:
+                    break
+                plane[y], carry = plane[y] ^ carry, plane[y] & carry
+            if carry:
+                raise OverflowError("more boxes on a cell than the capacity of the grid")
+
+    def remove(self, box):
+        """Uncover the cells of a box placed with `add`."""
+        for y, mask in self.rows(box):
+            self.area -= mask.bit_count()
+            borrow = mask
+            for plane in self.planes:
+                if not borrow:
+                    break
+                plane[y], borrow = plane[y] ^ borrow, ~plane[y] & borrow
+
+    def occupied(self, y):
+        """Cells of row y covered at least once."""
+        row = 0
+        for plane in self.planes:
+            row |= plane[y]
+        return row
+
+    def shared(self, y):
+        """Cells of row y covered at least twice."""
+        row = 0
+        for plane in self.planes[1:]:
+            row |= plane[y]
+        return row
+
+    def overlap_area(self):
+        """Covered area counted with multiplicity, minus the covered cells."""
+        return self.area - sum(self.occupied(y).bit_count() for y in range(self.height))
+
+    def overlap_with(self, box, placed=None):
+        """
+        Area of the box covered by other boxes. If `placed` is a box of the
+        grid, it does not count as another box.
+        """
+        placed_rows = dict(self.rows(placed)) if placed is not None else {}
+        area = 0
+        for y, mask in self.rows(box):
+            own = placed_rows.get(y, 0)
+            others = (self.occupied(y) & ~own) | (self.shared(y) & own)
+            area += (mask & others).bit_count()
+        return area
+
+
+def grid_size(room_width, room_height, furniture_dict):
+    """Grid covering the room and the rotated pieces sticking out of it."""
+    longest = max(max(f.width, f.height) for f in furniture_dict.values())
+    return room_width + longest, room_height + longest
+
+
+def area_objective(state, furniture_dict, room_width, room_height, doors):
+    """
+    The objective function, with OVERLAP_AREA_PENALTY per unit of
+    overlapped area instead of OVERLAP_PENALTY per overlapping pair.
+    Overlapping a little costs less than overlapping a lot, which gives
+    the search a gradient towards separating the pieces.
+    """
+    names = list(furniture_dict.keys())
+    grid = OccupancyGrid(*grid_size(room_width, room_height, furniture_dict), len(state))
+    energy = 0
+    for (x, y, orientation), furniture in zip(state, furniture_dict.values()):
+        grid.add(furniture_to_bbox(furniture, (x, y, orientation)))
+        if furniture.preferred_on_wall and not furniture_on_wall(
+            furniture, (x, y, orientation), room_width, room_height
+        ):
+            energy += WALL_PENALTY * len(state)
+        for nearby_furniture_name in furniture.nearby_furniture:
+            energy += nearby_penalty(
+                furniture,
+                furniture_dict[nearby_furniture_name],
+                (x, y, orientation),
+                state[names.index(nearby_furniture_name)],
+            )
+        for door in doors:
+            if door_furniture_overlap(door, furniture, (x, y), room_width, room_height):
+                energy += DOOR_PENALTY
+    return energy + OVERLAP_AREA_PENALTY * grid.overlap_area()
+
+
+class FurniturePlacementOccupancyAnnealer(FurniturePlacementKernelAnnealer):
+    """
+    Block annealer minimizing `area_objective`.
+
+    Overlaps are tracked by an `OccupancyGrid` covering the room and the
+    parts of rotated pieces sticking out of it, so scoring a move costs a
+    few operations per row of the moved piece instead of a comparison
+    with every other piece. Wall, door and nearby terms are computed and
+    cached like in `FurniturePlacementKernelAnnealer`, and moves are still
+    rejected as soon as their energy change provably exceeds the threshold.
+    """
+
+    def __init__(self, room_width, room_height, doors, furniture_dict):
+        super().__init__(room_width, room_height, doors, furniture_dict)
+        self.grid_size = grid_size(room_width, room_height, furniture_dict)
+
+    def energy(self):
+        return area_objective(self.state, self.furniture_dict, self.room_width, self.room_height, self.doors)
+
+    def reset_cache(self):
+        n = len(self.state)
+        self.boxes = [furniture_to_bbox(f, p) for f, p in zip(self.furnitures, self.state)]
+        self.static = [self.static_penalty(i, self.state[i]) for i in range(n)]
+        self.near = [[0.0] * n for _ in range(n)]
+        for i in range(n):
+            for j in self.partners[i]:
+                if j > i:
+                    self.near[i][j] = self.near[j][i] = self.nearby_pair_penalty(i, j, self.state[i])
+        self.grid = OccupancyGrid(*self.grid_size, n)
+        for box in self.boxes:
+            self.grid.add(box)
+
+    def evaluate_move(self, move, threshold):
+        index = move[0]
+        placement = self.candidate_placement(move)
+        old_box = self.boxes[index]
+        old_overlap = self.grid.overlap_with(old_box, old_box)
+        near = self.near[index]
+        # The nearby and overlap terms of the new placement are not negative
+        static = self.static_penalty(index, placement)
+        dE = static - self.static[index]
+        if dE - sum(near) - OVERLAP_AREA_PENALTY * old_overlap > threshold:
+            self.aborted += 1
+            return None
+        row = {j: self.nearby_pair_penalty(index, j, placement) for j in self.partners[index]}
+        dE += sum(row.values()) - sum(near)
+        if dE - OVERLAP_AREA_PENALTY * old_overlap > threshold:
+            self.aborted += 1
+            return None
+        box = furniture_to_bbox(self.furnitures[index], placement)
+        dE += OVERLAP_AREA_PENALTY * (self.grid.overlap_with(box, old_box) - old_overlap)
+        if dE > threshold:
+            self.aborted += 1
+            return None
+        self.candidate = placement, box, static, row
+        return dE
+
+    def commit_move(self, move):
+        index = move[0]
+        placement, box, static, row = self.candidate
+        for j, value in row.items():
+            self.near[index][j] = self.near[j][index] = value
+        self.static[index] = static
+        self.grid.remove(self.boxes[index])
+        self.grid.add(box)
+        self.boxes[index] = box
+        self.state[index] = placement
@@ -0,0 +1,242 @@
+import multiprocessing
+import random
+import sys
+import time
+
+import numpy as np
+
+from room.algos.utils import time_string
+from room.kernel import FurniturePlacementKernelAnnealer
+from room.lahc import FurniturePlacementLAHC
+from room.shared import SharedIncumbent, SharedRoom
+from room.tabu import FurniturePlacementTabuSearch
+from room.vectorized import FurniturePlacementVectorizedBeamSearch, encode_state
+
+
+class EngineContext:
+    """
+    What an engine process of the portfolio shares with the others: the
+    room, the incumbent, its index as incumbent source, the target energy
+    and the stop event.
+    """
+
+    def __init__(self, source, room_name, incumbent_name, lock, stop, target_energy, options):
+        self.source = source
+        self.shared_room = SharedRoom.attach(room_name)
+        self.room = self.shared_room.room()
+        self.incumbent = SharedIncumbent.attach(incumbent_name, len(self.room[3]), lock)
+        self.stop = stop
+        self.target_energy = target_energy
+        self.options = options
+
+    def done(self):
+        return self.stop.is_set() or self.incumbent.energy <= self.target_energy
+
+    def publish(self, state, energy):
+        self.incumbent.publish(state, energy, self.source)
+
+    def close(self):
+        self.incumbent.close()
+        self.shared_room.close()
+
+
+def watch(solver, context):
+    """Replace the progress report of a solver by a check of the stop condition."""
+    def update(*args):
+        if context.done():
+            solver.user_exit = True
+    solver.update = update
+    solver.updates = max(solver.steps // 100, 2)
+
+
+def run_annealing_engine(context):
+    """
+    Anneal in rounds. Every round after the first restarts from the
+    incumbent, whichever engine found it, at a tenth of the temperature.
+    """
+    options = context.options
+    tmax = options["tmax"]
+    state = None
+    while not context.done():
+        annealer = FurniturePlacementKernelAnnealer(*context.room)
+        if state is not None:
+            annealer.state = annealer.copy_state(state)
+        annealer.set_schedule({'tmax': tmax, 'tmin': options["tmin"], 'steps': options["steps"], 'updates': 0})
+        annealer.target_energy = context.target_energy
+        watch(annealer, context)
+        best_state, best_energy = annealer.anneal_blocks()
+        context.publish(best_state, best_energy)
+        state = context.incumbent.read()[0]
+        tmax = options["tmax"] / 10
+
+
+def run_beam_search_engine(context):
+    """
+    Evolve a vectorized beam search over the shared tables. Every
+    `migration_interval` generations the incumbent replaces the worst
+    assignment if it is better than the population's best, and the
+    population restarts when it runs out of generations.
+    """
+    options = context.options
+    interval = options["migration_interval"]
+    while not context.done():
+        beam_search = FurniturePlacementVectorizedBeamSearch.from_tables(
+            context.shared_room.tables,
+            context.shared_room.door_maps,
+            population_size=options["population_size"],
+            temperature=options["tmax"],
+            max_generations=options["max_generations"],
+            seed=random.getrandbits(32),
+        )
+        for generation in range(options["max_generations"] + 1):
+            beam_search.fitness_population(beam_search.population, out=beam_search.fitnesses)
+            if generation % interval == 0:
+                best = int(np.argmin(beam_search.fitnesses))
+                context.publish(beam_search.population[best], float(beam_search.fitnesses[best]))
+                if context.done():
+                    break
+                state, energy = context.incumbent.read()
+                if energy < beam_search.fitnesses[best]:
+                    worst = int(np.argmax(beam_search.fitnesses))
+                    beam_search.population[worst] = encode_state(state)
+                    beam_search.fitnesses[worst] = energy
+            beam_search.step()
+        beam_search = None
+
+
+def run_local_search_engine(solver_class):
+    def run(context):
+        """Run rounds of the local search, each one from the incumbent."""
+        state = None
+        while not context.done():
+            solver = solver_class(*context.room)
+            if state is not None:
+                solver.state = solver.copy_state(state)
+            solver.steps = context.options["steps"]
+            solver.target_energy = context.target_energy
+            watch(solver, context)
+            best_state, best_energy = solver.run()
+            context.publish(best_state, best_energy)
+            state = context.incumbent.read()[0]
+    return run
+
+
+# Engines of the portfolio
+ENGINES = {
+    "annealing": run_annealing_engine,
+    "beamsearch": run_beam_search_engine,
+    "tabu": run_local_search_engine(FurniturePlacementTabuSearch),
+    "lahc": run_local_search_engine(FurniturePlacementLAHC),
+}
+
+
+def run_engine(engine, source, room_name, incumbent_name, lock, stop, target_energy, options, seed):
+    random.seed(seed)
+    context = EngineContext(source, room_name, incumbent_name, lock, stop, target_energy, options)
+    try:
+        ENGINES[engine](context)
+    finally:
+        context.close()
+
+
+class PortfolioSolver:
+    """
+    Run several engines at the same time, one process each, on a room
+    shared through shared memory. Every engine publishes its best
+    placement to a shared incumbent and picks the incumbent up again:
+    the annealer and the local searches restart from it, the beam search
+    injects it into its population. All the engines stop as soon as the
+    incumbent reaches the target energy (0 or the room's lower bound), or
+    when the time limit is over.
+    """
+
+    def __init__(
+        self,
+        room_width,
+        room_height,
+        doors,
+        furniture_dict,
+        engines=tuple(ENGINES),
+        time_limit=60,
+        target_energy=0,
+        tmax=5000,
+        tmin=0.001,
+        steps=10000,
+        population_size=100,
+        max_generations=1000,
+        migration_interval=10,
+        seed=None,
+    ):
+        self.room = (room_width, room_height, doors, furniture_dict)
+        self.engines = list(engines)
+        self.time_limit = time_limit
+        self.target_energy = target_energy
+        self.options = {
+            "tmax": tmax,
+            "tmin": tmin,
+            "steps": steps,
+            "population_size": population_size,
+            "max_generations": max_generations,
+            "migration_interval": migration_interval,
+        }
+        self.seed = seed
+        self.winner = None
+
+    def run(self):
+        """
+        Run the portfolio and return the best placement as a list of tuples.
+        The engine that found it is stored in `winner`.
+        """
+        self.start = time.time()
+        seeds = random.Random(self.seed)
+        room = SharedRoom.create(*self.room)
+        lock = multiprocessing.Lock()
+        stop = multiprocessing.Event()
+        incumbent = SharedIncumbent.create(len(self.room[3]), lock)
+        processes = [
+            multiprocessing.Process(
+                target=run_engine,
+                args=(engine, source, room.name, incumbent.name, lock, stop,
+                      self.target_energy, self.options, seeds.getrandbits(32)),
+            )
+            for source, engine in enumerate(self.engines)
+        ]
+        try:
+            for process in processes:
+                process.start()
+            while any(process.is_alive() for process in processes):
+                self.update(incumbent)
+                if incumbent.energy <= self.target_energy or time.time() - self.start > self.time_limit:
+                    stop.set()
+                time.sleep(0.1)
+            for process in processes:
+                process.join()
+            if incumbent.source < 0:
+                raise RuntimeError(
+                    "No engine published a placement, exit codes %s"
+                    % {engine: process.exitcode for engine, process in zip(self.engines, processes)}
+                )
+            for engine, process in zip(self.engines, processes):
+                if process.exitcode != 0:
+                    print("\nWarning: engine %s exited with code %s" % (engine, process.exitcode))
+            best_state, best_energy = incumbent.read()
+            self.update(incumbent)
+            self.winner = self.engines[incumbent.source]
+            print("\nBest energy %s found by %s" % (best_energy, self.winner))
+            return best_state
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            incumbent.close()
+            room.close()
+
+    def update(self, incumbent):
+        """Outputs the best energy and the engine that found it to stderr."""
+        source = incumbent.source
+        print('\r{Engine:>12s}  best {Best:12.2f}   {Elapsed:s}'
+              .format(Engine=self.engines[source] if source >= 0 else "-",
+                      Best=incumbent.energy,
+                      Elapsed=time_string(time.time() - self.start)),
+              file=sys.stderr, end="")
+        sys.stderr.flush()
@@ -0,0 +1,399 @@
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+
+from room.annealing import FurniturePlacementAnnealer
+from room.benchmark import BEAM_POPULATION, ENGINES
+from room.functions import (
+    Door,
+    Furniture,
+    FurnitureFront,
+    Orientation,
+    furniture_on_wall,
+    furniture_to_bbox,
+    nearby_penalty,
+    objective,
+)
+from room.vectorized import FurniturePlacementVectorizedBeamSearch, RoomTables, objective_population, random_population
+
+# Furniture counts of the synthetic rooms
+DEFAULT_SIZES = [10, 25, 50, 100, 200, 300]
+
+# Budgets every size must meet to pass
+DEFAULT_BUDGETS = {
+    "time_to_target": 60.0,  # seconds
+    "peak_memory": 512.0,  # MB of peak RSS growth of a measurement
+    "evaluations_per_second": 100.0,  # full objective evaluations
+}
+
+# Length of the doors of the synthetic rooms
+DOOR_LENGTH = 2
+
+COLORS = ["tab:blue", "tab:orange", "tab:green", "tab:red", "tab:purple", "tab:brown", "tab:pink", "tab:olive"]
+
+
+def synthetic_room(n, density=0.3, seed=0):
+    """
+    Synthetic room of n pieces with a known placement of energy 0.
+
+    The pieces, of random sizes and fronts, are packed row by row into a
+    room about as wide as it is tall, with a free band along the top wall
+    holding the doors (one per 50 pieces) and a free margin for the
+    solvers to move pieces around. A `density` fraction of the pieces that
+    the packed placement leaves against a wall prefer the wall, and the
+    same fraction of the pieces get a nearby preference towards a
+    neighbour that the packed placement satisfies, so a higher density
+    constrains the room more without making it unsolvable.
+    Returns (room_width, room_height, doors, furniture_dict, placement).
+    """
+    rng = random.Random(seed)
+    pieces, orientations = [], []
+    for i in range(n):
+        front = rng.choice([None, FurnitureFront.SHORT_SIDE, FurnitureFront.LONG_SIDE])
+        pieces.append(
+            Furniture("piece %d" % i, rng.randint(1, 4), rng.randint(1, 4), rng.choice(COLORS), False, [], front)
+        )
+        orientations.append(rng.choice(list(Orientation)) if front else None)
+    boxes = [furniture_to_bbox(f, (0, 0, o)) for f, o in zip(pieces, orientations)]
+    row_width = math.ceil(math.sqrt(sum(w * h for _, _, w, h in boxes) * 1.5))
+
+    # Pack the pieces in rows, left to right
+    placement, x, y, row_height = [], 0, 0, 0
+    for orientation, (_, _, width, height) in zip(orientations, boxes):
+        if x + width > row_width:
+            x, y, row_height = 0, y + row_height, 0
+        placement.append((x, y, orientation))
+        x += width
+        row_height = max(row_height, height)
+    longest = max(max(f.width, f.height) for f in pieces)
+    room_width = max(row_width, longest)
+    room_height = y + row_height + longest + DOOR_LENGTH
+    count = n // 50 + 1
+    doors = [
+        Door("door %d" % k, (k * room_width // count, room_height), DOOR_LENGTH, True)
+        for k in range(count)
+        if k * room_width // count + DOOR_LENGTH <= room_width
+    ]
+
+    for i, f in enumerate(pieces):
+        if f.front and furniture_on_wall(f, placement[i], room_width, room_height) and rng.random() < density:
+            f.preferred_on_wall = True
+        if rng.random() < density:
+            candidates = [
+                j for j in range(n)
+                if j != i and nearby_penalty(f, pieces[j], placement[i], placement[j]) == 0
+            ]
+            if candidates:
+                f.nearby_furniture = [pieces[rng.choice(candidates)].name]
+    furniture_dict = {f.name: f for f in pieces}
+    return room_width, room_height, doors, furniture_dict, placement
+
+
+def log_log_slope(sizes, values):
+    """
+    Least squares slope of log(value) against log(size): the empirical
+    exponent k of value ~ size ** k. None with fewer than two positive values.
+    """
+    points = [(math.log(s), math.log(v)) for s, v in zip(sizes, values) if v is not None and v > 0]
+    if len(points) < 2:
+        return None
+    xs, ys = np.array(points).T
+    return float(np.polyfit(xs, ys, 1)[0])
+
+
+def peak_rss():
+    """Peak resident set size of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss():
+    """Resident set size of this process in MB, or its peak without /proc."""
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+    except OSError:
+        return peak_rss()
+    return pages * resource.getpagesize() / 2**20
+
+
+def measure_throughput(n, density, seed, duration=0.5):
+    """
+    Full objective evaluations per second on random placements, and
+    placements per second scored by `objective_population`.
+    """
+    room_width, room_height, doors, furniture_dict, _ = synthetic_room(n, density, seed)
+    random.seed(seed)
+    annealer = FurniturePlacementAnnealer(room_width, room_height, doors, furniture_dict)
+    evaluations = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        objective(annealer.state, furniture_dict, room_width, room_height, doors)
+        evaluations += 1
+    objective_rate = evaluations / (time.perf_counter() - start)
+
+    tables = RoomTables(room_width, room_height, doors, furniture_dict)
+    population = random_population(tables, BEAM_POPULATION, np.random.default_rng(seed))
+    out = np.empty(BEAM_POPULATION)
+    rows = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        objective_population(population, tables, out=out)
+        rows += BEAM_POPULATION
+    return {
+        "evaluations_per_second": objective_rate,
+        "vectorized_per_second": rows / (time.perf_counter() - start),
+    }
+
+
+def measure_memory(n, density, seed, copies=100):
+    """
+    Peak memory traced by `tracemalloc` in MB while evaluating the
+    objective function once, while keeping `copies` copies of an annealer
+    state, and while building and stepping a beam search population, with
+    the growth of the peak RSS over the RSS of the process at the start.
+    """
+    baseline = current_rss()
+    room_width, room_height, doors, furniture_dict, _ = synthetic_room(n, density, seed)
+    random.seed(seed)
+    peaks = {}
+    tracemalloc.start()
+    annealer = FurniturePlacementAnnealer(room_width, room_height, doors, furniture_dict)
+
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    objective(annealer.state, furniture_dict, room_width, room_height, doors)
+    peaks["objective"] = (tracemalloc.get_traced_memory()[1] - base) / 2**20
+
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    states = [annealer.copy_state(annealer.state) for _ in range(copies)]
+    peaks["state_copies"] = (tracemalloc.get_traced_memory()[1] - base) / 2**20
+    del states
+
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    beam_search = FurniturePlacementVectorizedBeamSearch(
+        room_width, room_height, doors, furniture_dict,
+        population_size=BEAM_POPULATION, temperature=5000, max_generations=1, seed=seed,
+    )
+    beam_search.fitness_population(beam_search.population, out=beam_search.fitnesses)
+    beam_search.step()
+    peaks["beam_population"] = (tracemalloc.get_traced_memory()[1] - base) / 2**20
+    tracemalloc.stop()
+    peaks["peak_memory"] = peak_rss() - baseline
+    return peaks
+
+
+def measure_time_to_target(n, density, seed, engine, evaluations):
+    """
+    Run an engine on a synthetic room with a budget of objective
+    evaluations. Returns the elapsed time, the best energy (the target is
+    0, the energy of the packed placement) and the growth of the peak RSS
+    over the RSS of the process at the start.
+    """
+    baseline = current_rss()
+    room_width, room_height, doors, furniture_dict, _ = synthetic_room(n, density, seed)
+    random.seed(seed)
+    start = time.perf_counter()
+    energy = ENGINES[engine]((room_width, room_height, doors, furniture_dict), evaluations)
+    return {"elapsed": time.perf_counter() - start, "energy": energy, "peak_memory": peak_rss() - baseline}
+
+
+def run_isolated(function, args, timeout):
+    """
+    Run a measurement in a fresh process, so its peak RSS is not raised by
+    earlier measurements, and give up after `timeout` seconds. The process
+    is forked and starts with the RSS of this one, which the measurements
+    subtract. Returns None on timeout.
+    """
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        result = pool.apply_async(function, args)
+        try:
+            return result.get(timeout)
+        except multiprocessing.TimeoutError:
+            pool.terminate()
+            return None
+
+
+def scaling_report(sizes=DEFAULT_SIZES, density=0.3, engines=tuple(ENGINES), evaluations=20000, seeds=1,
+                   timeout=None, budgets=DEFAULT_BUDGETS):
+    """
+    Measure how throughput, memory and time to target grow with the
+    number of pieces, every measurement in its own process. Runs that
+    exceed the time budget (or `timeout`) are stopped and fail. Returns
+    {"sizes": [...], "measurements": {...}, "slopes": {...}, "budgets": {...}}.
+    """
+    timeout = timeout or budgets["time_to_target"]
+    measurements = {}
+    for n in sizes:
+        row = measurements[n] = {}
+        throughput = run_isolated(measure_throughput, (n, density, 0), timeout) or {}
+        memory = run_isolated(measure_memory, (n, density, 0), timeout) or {}
+        row.update(throughput)
+        row.update(memory)
+        row["engines"] = {}
+        for engine in engines:
+            times, energies, peaks = [], [], []
+            for seed in range(seeds):
+                result = run_isolated(measure_time_to_target, (n, density, seed, engine, evaluations), timeout)
+                if result is None:
+                    energies.append(None)
+                    continue
+                energies.append(result["energy"])
+                peaks.append(result["peak_memory"])
+                if result["energy"] <= 1e-9:
+                    times.append(result["elapsed"])
+            row["engines"][engine] = {
+                "solved": len(times),
+                "time_to_target": sum(times) / len(times) if len(times) == seeds else None,
+                "energies": energies,
+                "peak_memory": max(peaks) if peaks else None,
+            }
+        print_size(n, row, budgets)
+
+    slopes = {
+        metric: log_log_slope(sizes, [measurements[n].get(metric) for n in sizes])
+        for metric in ("evaluations_per_second", "vectorized_per_second", "objective", "state_copies", "beam_population")
+    }
+    for engine in engines:
+        slopes["time_to_target/" + engine] = log_log_slope(
+            sizes, [measurements[n]["engines"][engine]["time_to_target"] for n in sizes]
+        )
+    return {"sizes": list(sizes), "density": density, "evaluations": evaluations,
+            "measurements": measurements, "slopes": slopes, "budgets": dict(budgets)}
+
+
+def throughput_passes(row, budgets):
+    """Whether the objective throughput at one size is within the budget."""
+    rate = row.get("evaluations_per_second")
+    return rate is not None and rate >= budgets["evaluations_per_second"]
+
+
+def passes(row, engine, budgets):
+    """Whether the throughput and an engine's results at one size are within the budgets."""
+    result = row["engines"][engine]
+    return (
+        throughput_passes(row, budgets)
+        and result["time_to_target"] is not None
+        and result["time_to_target"] <= budgets["time_to_target"]
+        and result["peak_memory"] is not None
+        and result["peak_memory"] <= budgets["peak_memory"]
+    )
+
+
+def print_size(n, row, budgets):
+    rate = row.get("evaluations_per_second")
+    print("\n%d pieces: %s objective evaluations/s (%s), %s placements/s vectorized" % (
+        n,
+        "%.0f" % rate if rate is not None else "-",
+        "PASS" if throughput_passes(row, budgets) else "FAIL",
+        "%.0f" % row["vectorized_per_second"] if "vectorized_per_second" in row else "-",
+    ))
+    if "objective" in row:
+        print("  traced peak (MB): objective %.3f, state copies %.3f, beam population %.3f, RSS growth %.1f" % (
+            row["objective"], row["state_copies"], row["beam_population"], row["peak_memory"]))
+    print("  %-12s %8s %16s %16s %6s" % ("Engine", "Solved", "Time to 0 (s)", "RSS growth (MB)", ""))
+    for engine, result in row["engines"].items():
+        print("  %-12s %8d %16s %16s %6s" % (
+            engine,
+            result["solved"],
+            "%.3f" % result["time_to_target"] if result["time_to_target"] is not None else "-",
+            "%.1f" % result["peak_memory"] if result["peak_memory"] is not None else "-",
+            "PASS" if passes(row, engine, budgets) else "FAIL",
+        ))
+
+
+def print_summary(report):
+    """Empirical exponents and the largest size every engine passes at."""
+    print("\nEmpirical exponents (value ~ pieces ** k)")
+    for metric, slope in report["slopes"].items():
+        print("  %-32s %s" % (metric, "%.2f" % slope if slope is not None else "-"))
+    print("\nLargest size within the budgets")
+    engines = report["measurements"][report["sizes"][0]]["engines"]
+    for engine in engines:
+        passing = [n for n in report["sizes"] if passes(report["measurements"][n], engine, report["budgets"])]
+        print("  %-12s %s" % (engine, max(passing) if passing else "-"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling of the solvers with the number of furniture pieces")
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=DEFAULT_SIZES,
+        help="Numbers of pieces of the synthetic rooms (default: %s)" % " ".join(map(str, DEFAULT_SIZES)),
+    )
+    parser.add_argument(
+        "--density",
+        type=float,
+        default=0.3,
+        help="Fraction of the pieces with wall and nearby preferences (default: 0.3)",
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(ENGINES),
+        default=list(ENGINES),
+        help="Engines to run (default: all)",
+    )
+    parser.add_argument(
+        "--evaluations",
+        type=int,
+        default=20000,
+        help="Objective evaluations per run (default: 20000)",
+    )
+    parser.add_argument(
+        "--seeds",
+        type=int,
+        default=1,
+        help="Number of seeds per size and engine (default: 1)",
+    )
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        default=DEFAULT_BUDGETS["time_to_target"],
+        help="Seconds an engine may take to reach the target (default: %s)" % DEFAULT_BUDGETS["time_to_target"],
+    )
+    parser.add_argument(
+        "--memory_budget",
+        type=float,
+        default=DEFAULT_BUDGETS["peak_memory"],
+        help="Peak RSS growth in MB a run may reach (default: %s)" % DEFAULT_BUDGETS["peak_memory"],
+    )
+    parser.add_argument(
+        "--min_evaluations",
+        type=float,
+        default=DEFAULT_BUDGETS["evaluations_per_second"],
+        help="Objective evaluations per second required (default: %s)" % DEFAULT_BUDGETS["evaluations_per_second"],
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=None,
+        help="JSON file of the measurements",
+    )
+    args = parser.parse_args()
+    budgets = {
+        "time_to_target": args.time_budget,
+        "peak_memory": args.memory_budget,
+        "evaluations_per_second": args.min_evaluations,
+    }
+    report = scaling_report(args.sizes, args.density, args.engines, args.evaluations, args.seeds, budgets=budgets)
+    print_summary(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print("\nMeasurements saved as '%s'" % args.output)
+
+
+if __name__ == "__main__":
+    main()
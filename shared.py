@@ -0,0 +1,163 @@
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from room.config import ALIGNMENT, HEADER, compile_room, read_room, read_tables
+from room.vectorized import decode_state, door_penalty_maps, encode_state
+
+
+def maps_offset(buffer):
+    """Offset of the door penalty maps, after the compiled room."""
+    _, _, _, offset, length = HEADER.unpack_from(buffer)
+    end = offset + length
+    return end + -end % ALIGNMENT
+
+
+class SharedRoom:
+    """
+    Compiled room in a shared memory block: the `RoomTables` arrays (piece
+    dimensions, sizes per orientation, door boxes, nearby pairs...) and
+    the JSON description of `room.config.compile_room`, followed by the
+    door penalty maps of every piece. Worker processes attach by name and
+    read the arrays in place, nothing is pickled or copied. Workers must
+    be started by the creating process, which frees the block.
+    """
+
+    def __init__(self, block, owner):
+        self.block = block
+        self.owner = owner
+        self.tables = read_tables(block.buf)
+        self.door_maps = np.ndarray(
+            (len(self.tables), self.tables.room_width + 1, self.tables.room_height + 1),
+            dtype=np.float64,
+            buffer=block.buf,
+            offset=maps_offset(block.buf),
+        )
+
+    @property
+    def name(self):
+        return self.block.name
+
+    @classmethod
+    def create(cls, room_width, room_height, doors, furniture_dict):
+        """Compile a room into a new shared memory block."""
+        compiled = compile_room(room_width, room_height, doors, furniture_dict)
+        maps = door_penalty_maps(read_tables(compiled))
+        offset = maps_offset(compiled)
+        block = shared_memory.SharedMemory(create=True, size=offset + maps.nbytes)
+        block.buf[: len(compiled)] = compiled
+        np.ndarray(maps.shape, dtype=maps.dtype, buffer=block.buf, offset=offset)[...] = maps
+        return cls(block, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to the shared room created by another process."""
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    def room(self):
+        """Room objects (width, height, doors, furniture_dict) of the shared room."""
+        return read_room(self.block.buf)
+
+    def close(self):
+        """Detach from the block, and free it if this process created it."""
+        self.tables = self.door_maps = None
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
+
+
+class SharedIncumbent:
+    """
+    Best placement found by a group of processes, published in a shared
+    memory block as a sequence counter, the energy, the source (an integer
+    identifying the publisher) and the (n, 3) state array.
+
+    Readers never lock: the block is a sequence lock, a writer makes the
+    counter odd while it writes and even again when it is done, and a
+    reader retries until it reads the same even counter before and after
+    copying. Writers are serialized by a `multiprocessing.Lock` that must
+    be handed to the worker processes when they are started, and only
+    publish placements better than the current one.
+    """
+
+    def __init__(self, block, n, lock, owner):
+        self.block = block
+        self.n = n
+        self.lock = lock
+        self.owner = owner
+        self.sequence = np.ndarray(1, dtype=np.uint64, buffer=block.buf, offset=0)
+        self.energy_cell = np.ndarray(1, dtype=np.float64, buffer=block.buf, offset=8)
+        self.source_cell = np.ndarray(1, dtype=np.int64, buffer=block.buf, offset=16)
+        self.state = np.ndarray((n, 3), dtype=np.int64, buffer=block.buf, offset=24)
+
+    @property
+    def name(self):
+        return self.block.name
+
+    @classmethod
+    def create(cls, n, lock=None):
+        """New incumbent for placements of n pieces, with infinite energy."""
+        block = shared_memory.SharedMemory(create=True, size=24 + 24 * n)
+        incumbent = cls(block, n, lock or multiprocessing.Lock(), owner=True)
+        incumbent.sequence[0] = 0
+        incumbent.energy_cell[0] = math.inf
+        incumbent.source_cell[0] = -1
+        return incumbent
+
+    @classmethod
+    def attach(cls, name, n, lock):
+        """Attach to the incumbent created by another process."""
+        return cls(shared_memory.SharedMemory(name=name), n, lock, owner=False)
+
+    @property
+    def energy(self):
+        """Energy of the incumbent, read without copying the state."""
+        return float(self.energy_cell[0])
+
+    @property
+    def source(self):
+        """Source of the incumbent, -1 until something is published."""
+        return int(self.source_cell[0])
+
+    def read(self):
+        """
+        Consistent copy of the incumbent.
+        Returns (state, energy), state is None until something is published.
+        """
+        while True:
+            before = int(self.sequence[0])
+            if before % 2:
+                continue
+            energy = float(self.energy_cell[0])
+            state = self.state.copy()
+            if int(self.sequence[0]) == before:
+                break
+        if math.isinf(energy):
+            return None, energy
+        return decode_state(state), energy
+
+    def publish(self, state, energy, source=0):
+        """
+        Publish a placement if it is better than the incumbent.
+        Returns whether it was published.
+        """
+        if energy >= self.energy:
+            return False
+        with self.lock:
+            if energy >= self.energy:
+                return False
+            self.sequence[0] += 1
+            self.energy_cell[0] = energy
+            self.source_cell[0] = source
+            self.state[...] = state if isinstance(state, np.ndarray) else encode_state(state)
+            self.sequence[0] += 1
+        return True
+
+    def close(self):
+        """Detach from the block, and free it if this process created it."""
+        self.sequence = self.energy_cell = self.source_cell = self.state = None
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def piece_signature(furniture, furniture_dict):
+    """
+    Everything the objective function knows about a piece besides its
+    name: dimensions, front, wall preference, the pieces it wants nearby
+    and the pieces that want it nearby.
+    """
+    wanted_by = sorted(f.name for f in furniture_dict.values() if furniture.name in f.nearby_furniture)
+    return (
+        furniture.width,
+        furniture.height,
+        furniture.front,
+        bool(furniture.preferred_on_wall),
+        tuple(sorted(furniture.nearby_furniture)),
+        tuple(wanted_by),
+    )
+
+
+def group_ids(furniture_dict):
+    """
+    For every piece, the index of the first piece it is interchangeable
+    with. Swapping the placements of two pieces with the same group id
+    never changes the objective function.
+    """
+    first = {}
+    return [
+        first.setdefault(piece_signature(furniture, furniture_dict), i)
+        for i, furniture in enumerate(furniture_dict.values())
+    ]
+
+
+def interchangeable_groups(groups):
+    """Indices of the pieces of every group of two or more interchangeable pieces."""
+    members = {}
+    for i, group in enumerate(groups):
+        members.setdefault(int(group), []).append(i)
+    return [indices for indices in members.values() if len(indices) > 1]
+
+
+def placement_order(placement):
+    x, y, orientation = placement
+    return x, y, orientation or ""
+
+
+def canonicalize_state(state, groups):
+    """
+    Equivalent state where the placements of interchangeable pieces are
+    sorted by position, so that permutations of identical pieces compare
+    and hash equal.
+    """
+    state = list(state)
+    for indices in interchangeable_groups(groups):
+        for i, placement in zip(indices, sorted((state[i] for i in indices), key=placement_order)):
+            state[i] = placement
+    return state
+
+
+def canonical_key(state, groups):
+    """Hashable key shared by all the permutations of a state's identical pieces."""
+    return tuple(canonicalize_state(state, groups))
+
+
+def canonicalize_population(population, groups, room_width, room_height):
+    """
+    Sort in place the placements of interchangeable pieces by position
+    in every assignment of a (P, n, 3) population, so that crossover
+    exchanges equivalent pieces.
+    """
+    for indices in interchangeable_groups(groups):
+        members = population[:, indices]
+        keys = (members[:, :, 0] * (room_height + 1) + members[:, :, 1]) * 8 + members[:, :, 2]
+        order = np.argsort(keys, axis=1, kind="stable")
+        population[:, indices] = np.take_along_axis(members, order[:, :, None], axis=1)
+    return population
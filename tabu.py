@@ -0,0 +1,131 @@
+import sys
+import time
+from collections import Counter, deque
+
+from room.algos.annealing import Annealer
+from room.algos.utils import time_string
+from room.annealing import FurniturePlacementAnnealer
+from room.symmetry import group_ids
+
+
+class TabuSearch(Annealer):
+    """
+    Tabu search over the moves of an annealer.
+
+    Every iteration samples `neighbourhood` moves of the current state
+    with `move` and takes the best one, even if it is worse than the
+    current state. Moving an element of a list-like state away from a
+    value makes (index, value) tabu for the next `tenure` iterations, so
+    the search cannot immediately undo its moves. The tabu list is a
+    hashed multiset, a tabu move is allowed anyway if it improves on the
+    best state found so far (aspiration).
+    """
+
+    # defaults
+    tenure = 20
+    neighbourhood = 20
+    steps = 2000
+    copy_strategy = 'slice'
+
+    def tabu_key(self, index, value):
+        """Tabu list entry for element `index` of the state taking `value`"""
+        return (index, value)
+
+    def run(self):
+        """Minimizes the energy of a system by tabu search.
+
+        Returns
+        (state, energy): the best state and energy found.
+        """
+        step = 0
+        self.start = time.time()
+        tabu = Counter()
+        recent = deque()
+
+        E = self.energy()
+        current = self.copy_state(self.state)
+        self.best_state = self.copy_state(self.state)
+        self.best_energy = E
+        if self.updates > 0:
+            updateWavelength = self.steps / self.updates
+            self.update(step, E, self.best_energy)
+
+        while step < self.steps and not self.user_exit:
+            step += 1
+            # Sample the neighbourhood and keep the best allowed move
+            chosen = chosen_energy = None
+            for _ in range(self.neighbourhood):
+                self.state = self.copy_state(current)
+                self.move()
+                candidate_energy = self.energy()
+                if chosen is not None and candidate_energy >= chosen_energy:
+                    continue
+                changes = [i for i, (old, new) in enumerate(zip(current, self.state)) if old != new]
+                if not changes:
+                    continue
+                is_tabu = any(tabu[self.tabu_key(i, self.state[i])] for i in changes)
+                if is_tabu and candidate_energy >= self.best_energy:
+                    continue
+                chosen, chosen_energy, chosen_changes = self.state, candidate_energy, changes
+
+            if chosen is not None:
+                for i in chosen_changes:
+                    key = self.tabu_key(i, current[i])
+                    tabu[key] += 1
+                    recent.append(key)
+                while len(recent) > self.tenure:
+                    key = recent.popleft()
+                    tabu[key] -= 1
+                    if not tabu[key]:
+                        del tabu[key]
+                current, E = chosen, chosen_energy
+                if E < self.best_energy:
+                    self.best_state = self.copy_state(current)
+                    self.best_energy = E
+            if self.updates > 1:
+                if (step // updateWavelength) > ((step - 1) // updateWavelength):
+                    self.update(step, E, self.best_energy)
+            if self.target_energy is not None and self.best_energy <= self.target_energy:
+                break
+
+        self.state = self.copy_state(self.best_state)
+        if self.save_state_on_exit:
+            self.save_state()
+        return self.best_state, self.best_energy
+
+    def default_update(self, step, E, best):
+        """Default update, outputs the current and best energy to stderr."""
+        elapsed = time.time() - self.start
+        if step == 0:
+            print('\n        Step        Energy          Best     Elapsed   Remaining',
+                  file=sys.stderr)
+            remain = 0.0
+        else:
+            remain = (self.steps - step) * (elapsed / step)
+        print('\r{Step:12d}  {Energy:12.2f}  {Best:12.2f}  {Elapsed:s}  {Remaining:s}'
+              .format(Step=step,
+                      Energy=E,
+                      Best=best,
+                      Elapsed=time_string(elapsed),
+                      Remaining=time_string(remain)),
+              file=sys.stderr, end="")
+        sys.stderr.flush()
+
+
+class FurniturePlacementTabuSearch(TabuSearch, FurniturePlacementAnnealer):
+    """
+    Tabu search for furniture placement with the annealer's moves.
+    Stops as soon as a placement without penalties is found.
+
+    Tabu entries are shared by interchangeable pieces: after a chair leaves
+    a position, no identical chair can take it either.
+    """
+
+    target_energy = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.groups = group_ids(self.furniture_dict)
+
+    def tabu_key(self, index, value):
+        return (self.groups[index], value)
@@ -0,0 +1,135 @@
+import numpy as np
+
+from room.vectorized import ORIENTATIONS, decode_state, encode_state
+
+# One accepted move: the piece that changed, its new placement and the energy change
+RECORD_DTYPE = np.dtype(
+    [
+        ("step", "<u4"),
+        ("index", "<u2"),
+        ("x", "<i4"),
+        ("y", "<i4"),
+        ("orientation", "u1"),
+        ("dE", "<f4"),
+    ]
+)
+
+
+class TrajectoryRecorder:
+    """
+    Records the moves accepted by an annealer into fixed-width records.
+
+    The record buffer is preallocated with room for `capacity` moves, in
+    memory or memory-mapped on `filename`. Every `snapshot_interval`
+    records the full state is stored as well, so `state_at` only replays
+    the records following the closest snapshot. Once the buffer is full
+    recording stops and `truncated` is set.
+    """
+
+    def __init__(self, capacity, n_pieces, snapshot_interval=1000, filename=None):
+        if filename:
+            self.records = np.memmap(filename, dtype=RECORD_DTYPE, mode="w+", shape=(capacity,))
+        else:
+            self.records = np.empty(capacity, dtype=RECORD_DTYPE)
+        n_snapshots = capacity // snapshot_interval + 1
+        self.snapshots = np.empty((n_snapshots, n_pieces, 3), dtype=np.int32)
+        self.snapshot_steps = np.empty(n_snapshots, dtype=np.int64)
+        self.snapshot_records = np.empty(n_snapshots, dtype=np.int64)
+        self.snapshot_energies = np.empty(n_snapshots)
+        self.snapshot_interval = snapshot_interval
+        self.count = 0
+        self.n_snapshots = 0
+        self.truncated = False
+        self.energy = None
+
+    def start(self, state, energy):
+        """Reset the recorder and take the initial snapshot."""
+        self.count = 0
+        self.n_snapshots = 0
+        self.truncated = False
+        self.energy = energy
+        self.snapshot(0, state)
+
+    def snapshot(self, step, state):
+        k = self.n_snapshots
+        self.snapshots[k] = encode_state(state)
+        self.snapshot_steps[k] = step
+        self.snapshot_records[k] = self.count
+        self.snapshot_energies[k] = self.energy
+        self.n_snapshots += 1
+
+    def record(self, step, previous_state, state, dE):
+        """Record the pieces that differ between the previous and the accepted state."""
+        if self.truncated:
+            return
+        self.energy += dE
+        for index, (old, new) in enumerate(zip(previous_state, state)):
+            if old == new:
+                continue
+            if self.count == len(self.records):
+                self.truncated = True
+                return
+            x, y, orientation = new
+            self.records[self.count] = (step, index, x, y, ORIENTATIONS.index(orientation), dE)
+            # Only the first changed piece carries the energy change of the move
+            dE = 0.0
+            self.count += 1
+        if self.count - self.snapshot_records[self.n_snapshots - 1] >= self.snapshot_interval:
+            if self.n_snapshots < len(self.snapshots):
+                self.snapshot(step, state)
+
+    def _replay(self, step):
+        k = int(np.searchsorted(self.snapshot_steps[: self.n_snapshots], step, side="right")) - 1
+        k = max(k, 0)
+        state = self.snapshots[k].copy()
+        start = self.snapshot_records[k]
+        # Records are appended in step order
+        end = start + int(np.searchsorted(self.records["step"][start : self.count], step, side="right"))
+        records = self.records[start:end]
+        state[records["index"], 0] = records["x"]
+        state[records["index"], 1] = records["y"]
+        state[records["index"], 2] = records["orientation"]
+        return state, self.snapshot_energies[k] + float(records["dE"].sum())
+
+    def state_at(self, step):
+        """Rebuild the annealer's current state after `step` without re-running the search."""
+        return decode_state(self._replay(step)[0])
+
+    def energy_at(self, step):
+        """Energy of the annealer's current state after `step`."""
+        return self._replay(step)[1]
+
+    def steps(self):
+        """Steps at which a move was accepted."""
+        return np.unique(self.records["step"][: self.count])
+
+    def save(self, fname):
+        """Saves the recorded trajectory to a compressed npz file"""
+        k = self.n_snapshots
+        np.savez_compressed(
+            fname,
+            records=self.records[: self.count],
+            snapshots=self.snapshots[:k],
+            snapshot_steps=self.snapshot_steps[:k],
+            snapshot_records=self.snapshot_records[:k],
+            snapshot_energies=self.snapshot_energies[:k],
+            snapshot_interval=self.snapshot_interval,
+            truncated=self.truncated,
+        )
+
+    @classmethod
+    def load(cls, fname):
+        """Loads a trajectory saved with `save`"""
+        with np.load(fname) as data:
+            records = data["records"]
+            snapshots = data["snapshots"]
+            recorder = cls(max(len(records), 1), snapshots.shape[1], int(data["snapshot_interval"]))
+            recorder.records[: len(records)] = records
+            recorder.count = len(records)
+            recorder.n_snapshots = len(snapshots)
+            recorder.snapshots[: len(snapshots)] = snapshots
+            recorder.snapshot_steps[: len(snapshots)] = data["snapshot_steps"]
+            recorder.snapshot_records[: len(snapshots)] = data["snapshot_records"]
+            recorder.snapshot_energies[: len(snapshots)] = data["snapshot_energies"]
+            recorder.truncated = bool(data["truncated"])
+        return recorder
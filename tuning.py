@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import time
+from statistics import NormalDist
+
+from room.annealing import FurniturePlacementAnnealer
+from room.config import load_room_config
+from room.functions import objective
+from room.vectorized import FurniturePlacementVectorizedBeamSearch
+
+# Default file of the tuned settings, loaded by main.py with --defaults
+DEFAULTS_FILE = "tuned_defaults.json"
+
+# Rooms are grouped by number of furniture pieces, the last class has no upper limit
+SIZE_CLASSES = [("small", 6), ("medium", 12), ("large", None)]
+
+# Candidate values of the tuned parameters, named after the options of main.py
+PARAMETER_GRIDS = {
+    "annealing": {
+        "tmax": [500, 5000, 25000],
+        "tmin": [0.001, 0.1],
+        "steps": [5000, 20000, 50000],
+    },
+    "beamsearch": {
+        "population_size": [10, 50, 200],
+        "tmax": [50, 500, 5000],
+        "max_generations": [200, 1000],
+    },
+}
+
+
+def size_class(furniture_dict):
+    """Name of the size class of a room."""
+    for name, limit in SIZE_CLASSES:
+        if limit is None or len(furniture_dict) <= limit:
+            return name
+
+
+def candidate_configurations(grid):
+    """All the combinations of the values of a parameter grid."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def run_annealing(room, settings, seed):
+    random.seed(seed)
+    annealer = FurniturePlacementAnnealer(*room)
+    annealer.set_schedule({'tmax': settings["tmax"], 'tmin': settings["tmin"], 'steps': settings["steps"], 'updates': 0})
+    annealer.target_energy = 0
+    return annealer.anneal()[1]
+
+
+def run_beam_search(room, settings, seed):
+    room_width, room_height, doors, furniture_dict = room
+    beam_search = FurniturePlacementVectorizedBeamSearch(
+        *room,
+        population_size=settings["population_size"],
+        temperature=settings["tmax"],
+        max_generations=settings["max_generations"],
+        seed=seed,
+    )
+    beam_search.update = lambda *args: None
+    with contextlib.redirect_stdout(io.StringIO()):
+        best_state = beam_search.run()
+    return objective(best_state, furniture_dict, room_width, room_height, doors)
+
+
+SOLVERS = {
+    "annealing": run_annealing,
+    "beamsearch": run_beam_search,
+}
+
+
+def evaluate(job):
+    """Run one configuration on one instance, returns (energy, elapsed time)."""
+    solver, settings, config_file, seed = job
+    room = load_room_config(config_file)
+    start = time.perf_counter()
+    energy = SOLVERS[solver](room, settings, seed)
+    return energy, time.perf_counter() - start
+
+
+def rank(values):
+    """Ranks starting from 1, tied values get the mean of their ranks."""
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def chi2_sf(x, df):
+    """Survival function of the chi-squared distribution with integer degrees of freedom."""
+    if x <= 0:
+        return 1.0
+    if df % 2 == 0:
+        term = total = math.exp(-x / 2)
+        for i in range(1, df // 2):
+            term *= x / (2 * i)
+            total += term
+        return min(total, 1.0)
+    total = math.erfc(math.sqrt(x / 2))
+    term = math.sqrt(2 * x / math.pi) * math.exp(-x / 2)
+    for i in range(1, (df + 1) // 2):
+        total += term
+        term *= x / (2 * i + 1)
+    return min(total, 1.0)
+
+
+def t_quantile(p, df):
+    """Quantile of Student's t distribution, Cornish-Fisher expansion of the normal one."""
+    z = NormalDist().inv_cdf(p)
+    return (
+        z
+        + (z ** 3 + z) / (4 * df)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+    )
+
+
+def friedman_race_step(results, alive, alpha=0.05):
+    """
+    Friedman test over the results of the alive candidates, one row per
+    instance, lower is better. If the test is significant, the candidates
+    whose rank sum is significantly worse than the best one (Conover's
+    post-hoc test, as in F-race) are dropped.
+    Returns the surviving candidates.
+    """
+    n, k = len(results), len(alive)
+    if k < 2:
+        return alive
+    rows = [rank([row[c] for c in alive]) for row in results]
+    sums = [sum(row[j] for row in rows) for j in range(k)]
+    a = sum(r * r for row in rows for r in row)
+    c = n * k * (k + 1) ** 2 / 4
+    if a == c:
+        # All the candidates tie on every instance
+        return alive
+    statistic = (k - 1) * (sum(s * s for s in sums) - n * c) / (a - c)
+    if chi2_sf(statistic, k - 1) >= alpha:
+        return alive
+    df = (n - 1) * (k - 1)
+    difference = t_quantile(1 - alpha / 2, df) * math.sqrt(
+        2 * n * (a - c) * (1 - statistic / (n * (k - 1))) / df
+    )
+    best = min(sums)
+    return [candidate for candidate, s in zip(alive, sums) if s - best <= difference]
+
+
+def race(solver, candidates, config_files, max_instances=30, min_instances=5, alpha=0.05, pool=None, processes=1):
+    """
+    Race the candidate settings of a solver over instances (room
+    configuration, seed) taken round robin from `config_files`. Every
+    round runs the surviving candidates on enough new instances to keep
+    the processes busy, and after `min_instances` instances losing
+    candidates are dropped by the Friedman test. A run is better than
+    another if it reaches a lower energy, or the same energy in less time.
+    Returns the best candidate and the number of instances it ran on.
+    """
+    instances = [(config_file, seed) for seed in range(max_instances) for config_file in config_files][:max_instances]
+    alive = list(range(len(candidates)))
+    results = []
+    while len(results) < len(instances) and len(alive) > 1:
+        block = instances[len(results) : len(results) + max(1, math.ceil(processes / len(alive)))]
+        jobs = [(solver, candidates[c], config_file, seed) for config_file, seed in block for c in alive]
+        outcomes = list((pool.map if pool else map)(evaluate, jobs))
+        for i in range(len(block)):
+            results.append(dict(zip(alive, outcomes[i * len(alive) : (i + 1) * len(alive)])))
+        if len(results) >= min_instances:
+            alive = friedman_race_step(results, alive, alpha)
+            print("%-10s %4d instances, %3d candidates left" % (solver, len(results), len(alive)))
+    mean_ranks = {c: 0.0 for c in alive}
+    for row in results:
+        for c, r in zip(alive, rank([row[c] for c in alive])):
+            mean_ranks[c] += r / len(results)
+    best = min(alive, key=lambda c: mean_ranks[c])
+    return candidates[best], len(results)
+
+
+def tune(config_files, solvers=tuple(SOLVERS), grids=PARAMETER_GRIDS, max_instances=30, min_instances=5, alpha=0.05, processes=None):
+    """
+    Race the candidate settings of every solver separately on the rooms
+    of every size class.
+    Returns {size class: {solver: settings}}.
+    """
+    classes = {}
+    for config_file in config_files:
+        classes.setdefault(size_class(load_room_config(config_file)[3]), []).append(config_file)
+    processes = processes or multiprocessing.cpu_count()
+    recommended = {}
+    with multiprocessing.Pool(processes) as pool:
+        for name, files in classes.items():
+            print("\nSize class '%s': %s" % (name, ", ".join(files)))
+            recommended[name] = {}
+            for solver in solvers:
+                settings, instances = race(
+                    solver, candidate_configurations(grids[solver]), files, max_instances, min_instances, alpha, pool, processes
+                )
+                print("%-10s best settings %s" % (solver, settings))
+                recommended[name][solver] = settings
+    return recommended
+
+
+def load_tuned_defaults(path, furniture_dict, algorithm):
+    """
+    Tuned settings of an algorithm for the size class of a room, as
+    option name -> value. Empty if the file has none.
+    """
+    with open(path) as file:
+        defaults = json.load(file)
+    return defaults.get(size_class(furniture_dict), {}).get(algorithm, {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the solver settings by racing them on room configurations")
+    parser.add_argument(
+        "-c",
+        "--configs",
+        nargs="+",
+        required=True,
+        help="Paths to the room configuration YAML files",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=DEFAULTS_FILE,
+        help="JSON file of the recommended settings (default: %s)" % DEFAULTS_FILE,
+    )
+    parser.add_argument(
+        "--solvers",
+        nargs="+",
+        choices=list(SOLVERS),
+        default=list(SOLVERS),
+        help="Solvers to tune (default: all)",
+    )
+    parser.add_argument(
+        "--max_instances",
+        type=int,
+        default=30,
+        help="Maximum number of (configuration, seed) instances per race (default: 30)",
+    )
+    parser.add_argument(
+        "--min_instances",
+        type=int,
+        default=5,
+        help="Instances run before the first elimination (default: 5)",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.05,
+        help="Significance level of the Friedman test (default: 0.05)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of cores)",
+    )
+    args = parser.parse_args()
+    recommended = tune(
+        args.configs, args.solvers, PARAMETER_GRIDS, args.max_instances, args.min_instances, args.alpha, args.processes
+    )
+    with open(args.output, "w") as file:
+        json.dump(recommended, file, indent=2)
+    print("\nRecommended settings saved as '%s'" % args.output)
+
+
+if __name__ == "__main__":
+    main()
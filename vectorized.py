@@ -0,0 +1,342 @@
+import numpy as np
+
+from room.algos.beam import VectorizedBeamSearch
+from room.functions import (
+    DOOR_PENALTY,
+    NOT_FACE_TO_FACE_PENALTY,
+    OVERLAP_PENALTY,
+    PENALTY_DISTANCE_MULTIPLIER,
+    WALL_PENALTY,
+    Orientation,
+    furniture_to_bbox,
+)
+from room.symmetry import canonicalize_population, group_ids
+
+# Orientation codes used in state arrays, None is encoded as 0
+ORIENTATIONS = [None, Orientation.TOP, Orientation.BOTTOM, Orientation.LEFT, Orientation.RIGHT]
+NONE, TOP, BOTTOM, LEFT, RIGHT = range(len(ORIENTATIONS))
+OPPOSITE = np.array([NONE, BOTTOM, TOP, RIGHT, LEFT])
+
+
+def door_bbox(door):
+    """
+    Bounding box of the opening area in front of a door.
+    """
+    x, y = door.pos
+    length = door.length
+    if door.is_horizontal:
+        if y == 0:
+            return (x, y, x + length, y + length)
+        return (x, y - length, x + length, y)
+    if x == 0:
+        return (x, y, x + length, y + length)
+    return (x - length, y, x, y + length)
+
+
+class RoomTables:
+    """
+    Array representation of a room configuration.
+
+    sizes[i, o] is the (width, height) of the bounding box of piece i in
+    orientation code o, dims[i] its unrotated (width, height) and nearby
+    holds one (i, j) row for every piece j in the nearby_furniture of i.
+    groups[i] is the index of the first piece interchangeable with piece i.
+    """
+
+    # Arrays making up the tables, in the order they are stored by `room.config`
+    ARRAYS = ("dims", "sizes", "has_front", "rotatable", "on_wall", "door_boxes", "nearby", "groups")
+
+    def __init__(self, room_width, room_height, doors, furniture_dict):
+        furnitures = list(furniture_dict.values())
+        index = {name: i for i, name in enumerate(furniture_dict)}
+        self.room_width = room_width
+        self.room_height = room_height
+        self.dims = np.array([(f.width, f.height) for f in furnitures], dtype=np.int64).reshape(-1, 2)
+        self.sizes = np.array(
+            [
+                [furniture_to_bbox(f, (0, 0, orientation))[2:] for orientation in ORIENTATIONS]
+                for f in furnitures
+            ],
+            dtype=np.int64,
+        ).reshape(-1, len(ORIENTATIONS), 2)
+        self.has_front = np.array([f.front is not None for f in furnitures], dtype=bool)
+        self.rotatable = np.array(
+            [f.front is not None or f.width != f.height for f in furnitures], dtype=bool
+        )
+        self.on_wall = np.array([bool(f.preferred_on_wall) for f in furnitures], dtype=bool)
+        self.door_boxes = np.array([door_bbox(door) for door in doors], dtype=np.int64).reshape(-1, 4)
+        self.nearby = np.array(
+            [(i, index[name]) for i, f in enumerate(furnitures) for name in f.nearby_furniture],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        self.groups = np.array(group_ids(furniture_dict), dtype=np.int64)
+
+    @classmethod
+    def from_arrays(cls, room_width, room_height, **arrays):
+        """
+        Build tables from already computed arrays, without copying them.
+        """
+        tables = cls.__new__(cls)
+        tables.room_width = room_width
+        tables.room_height = room_height
+        for name in cls.ARRAYS:
+            setattr(tables, name, arrays[name])
+        return tables
+
+    def __len__(self):
+        return len(self.dims)
+
+
+def encode_state(state):
+    """
+    Convert a list of (x, y, orientation) tuples into an (n, 3) integer array.
+    """
+    return np.array(
+        [(x, y, ORIENTATIONS.index(orientation)) for x, y, orientation in state], dtype=np.int64
+    ).reshape(-1, 3)
+
+
+def decode_state(assignment):
+    """
+    Convert an (n, 3) integer array back into a list of (x, y, orientation) tuples.
+    """
+    return [(int(x), int(y), ORIENTATIONS[o]) for x, y, o in assignment]
+
+
+def facing(x1, y1, x2, y2, orientation, ox1, oy1, ox2, oy2):
+    """
+    Whether the box (x1, y1, x2, y2) faces the box (ox1, oy1, ox2, oy2)
+    given its orientation code.
+    """
+    return np.select(
+        [orientation == TOP, orientation == BOTTOM, orientation == LEFT, orientation == RIGHT],
+        [y2 <= oy1, y1 >= oy2, x2 <= ox1, x1 >= ox2],
+        default=False,
+    )
+
+
+def door_overlap_counts(width, height, room_width, room_height, door_boxes):
+    """
+    Number of door opening areas overlapped by a width x height box at
+    every position (x, y) where it fits in the room.
+    """
+    xs = np.arange(room_width - width + 1)
+    ys = np.arange(room_height - height + 1)
+    counts = np.zeros((len(xs), len(ys)), dtype=np.int64)
+    for x1, y1, x2, y2 in door_boxes:
+        counts += np.outer((xs < x2) & (xs + width > x1), (ys < y2) & (ys + height > y1))
+    return counts
+
+
+def door_penalty_maps(tables):
+    """
+    Door penalty of every piece at every position, as an array of shape
+    (n, room_width + 1, room_height + 1). Doors are tested against the
+    unrotated furniture, so the penalty does not depend on the orientation.
+    """
+    maps = np.zeros((len(tables), tables.room_width + 1, tables.room_height + 1))
+    for i, (width, height) in enumerate(tables.dims):
+        counts = door_overlap_counts(width, height, tables.room_width, tables.room_height, tables.door_boxes)
+        maps[i, : counts.shape[0], : counts.shape[1]] = DOOR_PENALTY * counts
+    return maps
+
+
+def objective_population(population, tables, out=None, door_maps=None):
+    """
+    Objective function of every placement of a (P, n, 3) population.
+    Equivalent to calling `objective` on each decoded state.
+    With the `door_penalty_maps` of the tables, door penalties are looked
+    up instead of computed.
+    """
+    n = len(tables)
+    x, y, o = population[..., 0], population[..., 1], population[..., 2]
+    size = tables.sizes[np.arange(n), o]
+    x2, y2 = x + size[..., 0], y + size[..., 1]
+    energy = np.zeros(len(population)) if out is None else out
+    energy[...] = 0
+
+    # Overlaps, every pair is counted from both sides
+    overlaps = (
+        (x[:, :, None] < x2[:, None, :])
+        & (x[:, None, :] < x2[:, :, None])
+        & (y[:, :, None] < y2[:, None, :])
+        & (y[:, None, :] < y2[:, :, None])
+    )
+    overlaps[:, np.arange(n), np.arange(n)] = False
+    energy += OVERLAP_PENALTY * overlaps.sum(axis=(1, 2))
+
+    # Back of the furniture on the wall, penalized once per piece in the room
+    on_wall = np.select(
+        [o == TOP, o == BOTTOM, o == LEFT, o == RIGHT],
+        [y == 0, y2 == tables.room_height, x2 == tables.room_width, x == 0],
+        default=False,
+    )
+    energy += WALL_PENALTY * n * (tables.on_wall & ~on_wall).sum(axis=1)
+
+    # Doors, tested against the unrotated furniture
+    if door_maps is not None:
+        energy += door_maps[np.arange(n), x, y].sum(axis=1)
+    elif len(tables.door_boxes):
+        rx2 = (x + tables.dims[:, 0])[..., None]
+        ry2 = (y + tables.dims[:, 1])[..., None]
+        dx1, dy1, dx2, dy2 = tables.door_boxes.T
+        blocked = (x[..., None] < dx2) & (dx1 < rx2) & (y[..., None] < dy2) & (dy1 < ry2)
+        energy += DOOR_PENALTY * blocked.sum(axis=(1, 2))
+
+    # Nearby furniture
+    if len(tables.nearby):
+        a, b = tables.nearby.T
+        ax1, ay1, ax2, ay2, ao = x[:, a], y[:, a], x2[:, a], y2[:, a], o[:, a]
+        bx1, by1, bx2, by2, bo = x[:, b], y[:, b], x2[:, b], y2[:, b], o[:, b]
+        dx = np.maximum(np.maximum(bx1 - ax2, ax1 - bx2), 0)
+        dy = np.maximum(np.maximum(by1 - ay2, ay1 - by2), 0)
+        distance = np.hypot(dx, dy)
+        energy += np.where(distance > 0.5, distance * PENALTY_DISTANCE_MULTIPLIER, 0).sum(axis=1)
+        a_faces_b = facing(ax1, ay1, ax2, ay2, ao, bx1, by1, bx2, by2)
+        b_faces_a = facing(bx1, by1, bx2, by2, bo, ax1, ay1, ax2, ay2)
+        face_to_face = np.select(
+            [(ao == NONE) & (bo == NONE), bo == NONE, ao == NONE],
+            [True, a_faces_b, b_faces_a],
+            default=a_faces_b & (bo == OPPOSITE[ao]),
+        )
+        energy += NOT_FACE_TO_FACE_PENALTY * (~face_to_face).sum(axis=1)
+    return energy
+
+
+def random_population(tables, population_size, rng):
+    """
+    Generate random placements like `generate_initial_state`, as a (P, n, 3) array.
+    """
+    n = len(tables)
+    population = np.empty((population_size, n, 3), dtype=np.int64)
+    population[..., 0] = rng.integers(0, tables.room_width - tables.dims[:, 0] + 1, size=(population_size, n))
+    population[..., 1] = rng.integers(0, tables.room_height - tables.dims[:, 1] + 1, size=(population_size, n))
+    population[..., 2] = np.where(
+        tables.has_front, rng.choice([TOP, BOTTOM], size=(population_size, n)), NONE
+    )
+    return population
+
+
+class MutationBuffers:
+    """
+    Scratch arrays of `room_change_population` for populations of a given
+    size, so that mutating a generation allocates no new arrays.
+    """
+
+    def __init__(self, population_size, n):
+        self.uniforms = np.empty(population_size)
+        self.index = np.empty(population_size, dtype=np.int64)
+        self.limits = np.empty(population_size, dtype=np.int64)
+        self.values = np.empty(population_size, dtype=np.int64)
+        self.current = np.empty(population_size, dtype=np.int64)
+        self.cells = np.empty(population_size, dtype=np.int64)
+        self.offsets = np.empty(population_size, dtype=np.int64)
+        self.rotate = np.empty(population_size, dtype=bool)
+        self.flags = np.empty(population_size, dtype=bool)
+        self.skip = np.empty(population_size, dtype=bool)
+        # Offset of the first gene of every assignment in the flattened population
+        self.rows = np.arange(population_size, dtype=np.int64) * n * 3
+
+
+def random_integers(rng, limits, buffers, out):
+    """Uniform integers in [0, limits) into out, drawn through the scratch uniforms."""
+    rng.random(out=buffers.uniforms)
+    np.multiply(buffers.uniforms, limits, out=buffers.uniforms)
+    np.copyto(out, buffers.uniforms, casting='unsafe')
+
+
+def room_change_population(population, tables, rng, buffers=None):
+    """
+    Apply one `room_change` to every placement of the population in place:
+    a random piece of each placement is either rotated or moved.
+    The population must be C-contiguous. Pass the `MutationBuffers` of the
+    population size to mutate without allocating.
+    """
+    buffers = buffers or MutationBuffers(len(population), len(tables))
+    flat = population.reshape(-1)
+    random_integers(rng, len(tables), buffers, buffers.index)
+    np.multiply(buffers.index, 3, out=buffers.offsets)
+    buffers.offsets += buffers.rows
+    rng.random(out=buffers.uniforms)
+    np.less(buffers.uniforms, 0.5, out=buffers.rotate)
+    np.take(tables.rotatable, buffers.index, out=buffers.flags)
+    buffers.rotate &= buffers.flags
+
+    # Rotate to any orientation different from the current one
+    np.add(buffers.offsets, 2, out=buffers.cells)
+    np.take(flat, buffers.cells, out=buffers.current)
+    np.not_equal(buffers.current, NONE, out=buffers.flags)
+    np.subtract(4, buffers.flags, out=buffers.limits)
+    random_integers(rng, buffers.limits, buffers, buffers.values)
+    buffers.values += 1
+    # Skip the current orientation
+    np.greater_equal(buffers.values, buffers.current, out=buffers.skip)
+    buffers.skip &= buffers.flags
+    buffers.values += buffers.skip
+    np.copyto(buffers.current, buffers.values, where=buffers.rotate)
+    flat[buffers.cells] = buffers.current
+
+    # Move anywhere the unrotated furniture fits
+    move = np.logical_not(buffers.rotate, out=buffers.rotate)
+    for axis, size in enumerate((tables.room_width, tables.room_height)):
+        np.add(buffers.offsets, axis, out=buffers.cells)
+        np.take(tables.dims[:, axis], buffers.index, out=buffers.limits)
+        np.subtract(size + 1, buffers.limits, out=buffers.limits)
+        random_integers(rng, buffers.limits, buffers, buffers.values)
+        np.take(flat, buffers.cells, out=buffers.current)
+        np.copyto(buffers.current, buffers.values, where=move)
+        flat[buffers.cells] = buffers.current
+    return population
+
+
+class FurniturePlacementVectorizedBeamSearch(VectorizedBeamSearch):
+    """
+    Stochastic beam search for furniture placement over a (P, n, 3) population.
+    Interchangeable pieces are kept sorted by position in every assignment,
+    so crossover exchanges equivalent pieces and identical layouts that
+    only differ by a permutation of these pieces are stored the same way.
+    """
+
+    # Door penalty maps of the tables, see `door_penalty_maps`
+    door_maps = None
+    # Scratch arrays of the mutation, created with the first generation
+    mutation_buffers = None
+
+    def __init__(self, room_width, room_height, doors, furniture_dict, **kwargs):
+        self.tables = RoomTables(room_width, room_height, doors, furniture_dict)
+        super().__init__(**kwargs)
+
+    @classmethod
+    def from_tables(cls, tables, door_maps=None, **kwargs):
+        """
+        Beam search over already built tables, such as the arrays of a
+        `room.shared.SharedRoom`.
+        """
+        beam_search = cls.__new__(cls)
+        beam_search.tables = tables
+        beam_search.door_maps = door_maps
+        VectorizedBeamSearch.__init__(beam_search, **kwargs)
+        return beam_search
+
+    def random_population(self, population_size):
+        return self.canonicalize(random_population(self.tables, population_size, self.rng))
+
+    def fitness_population(self, population, out):
+        return objective_population(population, self.tables, out=out, door_maps=self.door_maps)
+
+    def mutate_population(self, population):
+        if self.mutation_buffers is None:
+            self.mutation_buffers = MutationBuffers(len(population), len(self.tables))
+        room_change_population(population, self.tables, self.rng, self.mutation_buffers)
+        self.canonicalize(population)
+
+    def canonicalize(self, population):
+        return canonicalize_population(
+            population, self.tables.groups, self.tables.room_width, self.tables.room_height
+        )
+
+    def run(self):
+        """
+        Run the beam search and return the best placement as a list of tuples.
+        """
+        return decode_state(super().run())
@@ -1,7 +1,21 @@
+import itertools
+import multiprocessing
+import os
+
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib import animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PatchCollection
+from matplotlib.figure import Figure
+from PIL import Image
 
 from room.functions import FurnitureFront, Orientation, furniture_to_bbox
 
+DOOR_WIDTH = 0.25
+DOOR_COLOR = 'lightgreen'
+LINE_COLOR = 'yellow'
+
 
 def xyxy_to_xywh(bbox):
     """
@@ -17,28 +31,18 @@ def print_room(furniture_dict, state):
     """
 
     print("\nFurnitures layout:")
-    for i, (x, y, orientation) in enumerate(state):
-        furniture_name = list(furniture_dict.keys())[i]
-        furniture = furniture_dict[furniture_name]
+    for furniture, (x, y, orientation) in zip(furniture_dict.values(), state):
         print(furniture.name, (x, y), orientation)
 
-def draw_room(room_width, room_height, doors, furniture_dict, state):
+
+def draw_doors(ax, doors):
     """
-    Draw the room layout with the final furniture placements.
+    Draw the doors on the room walls.
     """
-    fig, ax = plt.subplots(figsize=(10, 8))
-
-    # Draw the room
-    ax.add_patch(plt.Rectangle((0, 0), room_width, room_height, fill=False, edgecolor='black', linewidth=2))
-
-    DOOR_WIDTH = 0.25
-    DOOR_COLOR = 'lightgreen'
-
-    # Draw the doors
     for door in doors:
         x, y = door.pos
         if door.is_horizontal:
-            if y == 0:      
+            if y == 0:
                 ax.add_patch(plt.Rectangle((x, y), door.length, DOOR_WIDTH, facecolor=DOOR_COLOR, edgecolor='black', linewidth=1))
                 ax.text(x + door.length/2, y + DOOR_WIDTH / 2, door.name, ha='center', va='center', fontsize=8)
             else:
@@ -52,38 +56,202 @@ def draw_room(room_width, room_height, doors, furniture_dict, state):
                 ax.add_patch(plt.Rectangle((x - DOOR_WIDTH, y), DOOR_WIDTH, door.length, facecolor=DOOR_COLOR, edgecolor='black', linewidth=1))
                 ax.text(x - DOOR_WIDTH / 2, y + door.length/2, door.name, ha='center', va='center', fontsize=8, rotation=90)
 
-    print("-------")
-    # Draw the furniture
-    for i, (x, y, orientation) in enumerate(state):
-        furniture_name = list(furniture_dict.keys())[i]
-        furniture = furniture_dict[furniture_name]
-        bbox = furniture_to_bbox(furniture, (x, y, orientation))
-        x, y, w, h = xyxy_to_xywh(bbox)
-        
-        # print(furniture.name, "xy:", (x, y), "owh", (furniture.width, furniture.height), "wh", (w, h), "or:", orientation, "side:", furniture.front)
-        
-        # Draw the furniture
-        ax.add_patch(plt.Rectangle((x, y), w, h, facecolor=furniture.color, edgecolor='black', linewidth=1))
-        
-        # Draw a line to indicate the front of the furniture
-        LINE_COLOR = 'yellow'
-        if furniture.front is not None:
-            if orientation == Orientation.LEFT:
-                ax.plot([x, x], [y, y + h], color=LINE_COLOR, linewidth=2, linestyle=':')
+
+class LayoutRenderer:
+    """
+    Draws furniture layouts of one room on a single reusable figure.
+
+    The room and the doors are drawn once. The furniture is a single
+    PatchCollection, the fronts a single LineCollection and the names a
+    fixed set of Text artists, all updated in place by `render`, so
+    drawing many layouts does not create any new figure or artist.
+    Without a `figure` a pyplot-independent Agg figure is used, which is
+    safe to use from worker processes.
+    """
+
+    def __init__(self, room_width, room_height, doors, furniture_dict, figure=None, figsize=(10, 8), dpi=100):
+        self.furnitures = list(furniture_dict.values())
+        if figure is None:
+            figure = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(figure)
+        self.figure = figure
+        self.ax = ax = figure.add_subplot()
+
+        # Draw the room
+        ax.add_patch(plt.Rectangle((0, 0), room_width, room_height, fill=False, edgecolor='black', linewidth=2))
+        draw_doors(ax, doors)
+
+        # The furniture rectangles are moved in place on every render
+        n = len(self.furnitures)
+        self._rectangles = [plt.Rectangle((0, 0), 1, 1) for _ in range(n)]
+        self._segments = np.full((n, 2, 2), np.nan)
+        self.furniture = PatchCollection(
+            self._rectangles,
+            facecolors=[furniture.color for furniture in self.furnitures],
+            edgecolors='black',
+            linewidths=1,
+        )
+        ax.add_collection(self.furniture)
+        self.fronts = LineCollection(self._segments, colors=LINE_COLOR, linewidths=2, linestyles=':')
+        ax.add_collection(self.fronts)
+        self.names = [
+            ax.text(0, 0, furniture.name, ha='center', va='center', fontsize=8)
+            for furniture in self.furnitures
+        ]
+
+        # Set the axis limits and aspect ratio
+        ax.set_xlim(0, room_width)
+        ax.set_ylim(0, room_height)
+        ax.set_aspect('equal')
+        ax.set_title('Final Furniture Placement')
+
+    def render(self, state, title=None):
+        """
+        Move the furniture artists to the placement described by state.
+        """
+        for i, (furniture, (x, y, orientation)) in enumerate(zip(self.furnitures, state)):
+            x1, y1, x2, y2 = furniture_to_bbox(furniture, (x, y, orientation))
+            self._rectangles[i].set_bounds(x1, y1, x2 - x1, y2 - y1)
+            self.names[i].set_position(((x1 + x2) / 2, (y1 + y2) / 2))
+
+            # Line indicating the front of the furniture
+            segment = self._segments[i]
+            if furniture.front is None or orientation is None:
+                segment[:] = np.nan
+            elif orientation == Orientation.LEFT:
+                segment[:] = ((x1, y1), (x1, y2))
             elif orientation == Orientation.RIGHT:
-                ax.plot([x + w, x + w], [y, y + h], color=LINE_COLOR, linewidth=2, linestyle=':')
+                segment[:] = ((x2, y1), (x2, y2))
             elif orientation == Orientation.BOTTOM:
-                ax.plot([x, x + w], [y, y], color=LINE_COLOR, linewidth=2, linestyle=':')
+                segment[:] = ((x1, y1), (x2, y1))
             elif orientation == Orientation.TOP:
-                ax.plot([x, x + w], [y + h, y + h], color=LINE_COLOR, linewidth=2, linestyle=':')
-        
-        # Draw the furniture name
-        ax.text(x + w/2, y + h/2, furniture.name, ha='center', va='center', fontsize=8)
-
-    # Set the axis limits and aspect ratio
-    ax.set_xlim(0, room_width)
-    ax.set_ylim(0, room_height)
-    ax.set_aspect('equal')
-    ax.set_title('Final Furniture Placement')
-    plt.show()
-    plt.savefig("final_furniture_placement.png")
\ No newline at end of file
+                segment[:] = ((x1, y2), (x2, y2))
+        self.furniture.set_paths(self._rectangles)
+        self.fronts.set_segments(self._segments)
+        if title is not None:
+            self.ax.set_title(title)
+        return self.figure
+
+    def save(self, state, filename, title=None):
+        """
+        Render state and write the figure to filename.
+        """
+        self.render(state, title)
+        self.figure.savefig(filename)
+
+    def to_image(self, state, title=None):
+        """
+        Render state into an RGB PIL image.
+        """
+        self.render(state, title)
+        canvas = self.figure.canvas
+        canvas.draw()
+        return Image.frombuffer("RGBA", canvas.get_width_height(), canvas.buffer_rgba()).convert("RGB")
+
+
+def draw_room(room_width, room_height, doors, furniture_dict, state, filename="final_furniture_placement.png", show=True):
+    """
+    Draw the room layout with the final furniture placements.
+    """
+    fig = plt.figure(figsize=(10, 8))
+    LayoutRenderer(room_width, room_height, doors, furniture_dict, figure=fig).render(state)
+    fig.savefig(filename)
+    if show:
+        plt.show()
+    plt.close(fig)
+
+
+# Renderers of the worker processes, one per room configuration
+_renderers = {}
+
+
+def room_key(room_width, room_height, doors, furniture_dict):
+    """
+    Hashable description of everything the renderer draws besides the furniture placement.
+    """
+    return (
+        room_width,
+        room_height,
+        tuple((door.name, tuple(door.pos), door.length, door.is_horizontal) for door in doors),
+        tuple((f.name, f.width, f.height, f.color, f.front) for f in furniture_dict.values()),
+    )
+
+
+def _render_job(job):
+    room_width, room_height, doors, furniture_dict, state, filename = job
+    key = room_key(room_width, room_height, doors, furniture_dict)
+    renderer = _renderers.get(key)
+    if renderer is None:
+        if len(_renderers) >= 16:
+            _renderers.clear()
+        renderer = _renderers[key] = LayoutRenderer(room_width, room_height, doors, furniture_dict)
+    renderer.save(state, filename)
+    return filename
+
+
+def render_layouts(layouts, out_dir, prefix="layout", processes=None, chunksize=16):
+    """
+    Render many solved rooms to uniquely named PNG files using a pool of workers.
+
+    layouts is an iterable of (room_width, room_height, doors, furniture_dict, state)
+    tuples. Each worker keeps one renderer per room configuration, so rooms
+    sharing a configuration reuse the same figure.
+    Returns the list of written files, in the order of layouts.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = (
+        (*layout, os.path.join(out_dir, "%s_%06d.png" % (prefix, i)))
+        for i, layout in enumerate(layouts)
+    )
+    with multiprocessing.Pool(processes) as pool:
+        return list(pool.imap(_render_job, jobs, chunksize))
+
+
+def sample_trajectory(trajectory, frames=200):
+    """
+    Yield (step, state, energy) for about `frames` evenly spaced accepted
+    steps of a recorded annealing trajectory, replaying one at a time.
+    """
+    steps = trajectory.steps()
+    if len(steps) == 0:
+        return
+    for step in np.unique(steps[np.linspace(0, len(steps) - 1, min(frames, len(steps))).astype(int)]):
+        yield step, trajectory.state_at(step), trajectory.energy_at(step)
+
+
+def ffmpeg_available():
+    """Whether ffmpeg, which `animate` writes through, is installed."""
+    return animation.writers.is_available('ffmpeg')
+
+
+def animate(renderer, frames, filename, fps=10):
+    """
+    Stream an animation of (step, state, energy) frames to a GIF or MP4 file
+    with ffmpeg.
+
+    Frames are rendered one at a time and piped to ffmpeg, so frames can be
+    a generator and memory use does not depend on the number of frames.
+    Raises RuntimeError when ffmpeg is missing and ValueError when there
+    are no frames.
+    """
+    def title(step, energy):
+        return 'Step %d, energy %.2f' % (step, energy)
+
+    if not ffmpeg_available():
+        raise RuntimeError("Saving animations requires ffmpeg, which was not found")
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError("No frames to animate")
+
+    extra_args = None
+    if filename.endswith(".gif"):
+        # One palette per frame: a palette for the whole GIF would make
+        # ffmpeg buffer every frame before writing the first one
+        extra_args = ['-filter_complex', 'split [a][b];[a] palettegen=stats_mode=single [p];[b][p] paletteuse=new=1']
+    writer = animation.FFMpegWriter(fps=fps, extra_args=extra_args)
+    with writer.saving(renderer.figure, filename, renderer.figure.dpi):
+        for step, state, energy in itertools.chain([first], frames):
+            renderer.render(state, title(step, energy))
+            writer.grab_frame()
+    return filename